@@ -1,13 +1,153 @@
-from flask import Flask, jsonify, request
+import os
+
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS  
 from house_scraper import scrape_house_candidates
 from senate_scraper import scrape_senate_candidates, scrape_voter_info
 from municipal_scraper import scrape_municipal_candidates  
 from wiki import get_wikipedia_bio
+from civic import get_division_representatives, get_representatives
+from http_client import get_fetch_stats, get_pool_stats
+from fanout import iter_graph, run_graph, run_stages
+import event_stream
+import http_cache
+import page_cache
+from parsing import get_parse_memo_stats
+import prefetch
+import response_cache
+import rate_limit
+import resilience
+import result_cache
+import streaming
+from result_cache import normalize_key
+from snapshot import SNAPSHOT_PATH, SnapshotStore
 
 app = Flask(__name__)
 CORS(app)  
 
+# SERVE_FROM_SNAPSHOT=1 answers every request from the prebuilt snapshot
+# (see crawl.py) instead of scraping; only /api/representatives still goes
+# upstream, to the Civic API.
+snapshot_store = SnapshotStore(SNAPSHOT_PATH) if os.environ.get('SERVE_FROM_SNAPSHOT') == '1' else None
+
+# Seconds each part of /api/elections may take before it is reported as timed out.
+ELECTION_STAGE_TIMEOUTS = {
+    'houseCandidates': 10,
+    'senateCandidates': 10,
+    'voterInfo': 10,
+}
+
+# Bios prefetched for each /api/elections candidate list, with the role the
+# state page asks for when a card is clicked.
+ELECTION_BIO_ROLES = {'houseCandidates': 'Representative', 'senateCandidates': 'Senator'}
+
+# /api/candidate_bios: most names one request may ask for, how many uncached
+# bios it may fetch at once, and how long the whole batch may take.
+BIO_BATCH_LIMIT = 50
+BIO_BATCH_CONCURRENCY = int(os.environ.get('BIO_BATCH_CONCURRENCY', 6))
+BIO_BATCH_TIMEOUT = 15
+
+NOT_FOUND_BIOS = ("No biography found.", "No relevant biography found.")
+
+# Seconds from the start of an /api/ballot request until each part is
+# reported as timed out. Parts that wait on others get the longer deadlines.
+# The last must leave the request well inside the worker timeout (see
+# Procfile), or gunicorn kills the worker before the partial answer is sent.
+BALLOT_STAGE_TIMEOUTS = {
+    'representatives': 8,
+    'houseCandidates': 15,
+    'senateCandidates': 15,
+    'voterInfo': 15,
+    'municipalCandidates': 15,
+    'houseBios': 20,
+    'senateBios': 20,
+    'municipalBios': 20,
+}
+
+def cached_response(payload, parts, cacheable=True):
+    """jsonify a dict payload, tagging it with the age and staleness of the cached parts it came from.
+
+    A cacheable payload without 'errors' also gets an ETag from its parts
+    (see http_cache). If the request's If-None-Match already has it, the
+    answer is an empty 304 and the payload isn't serialized at all.
+    Otherwise the body comes from response_cache, serialized and
+    compressed only the first time that ETag is sent for the URL.
+    """
+    parts = list(parts)
+    age = max((part.age for part in parts), default=0)
+    etag = http_cache.response_etag(parts) if cacheable and 'errors' not in payload else None
+
+    def serialize():
+        return jsonify(dict(payload, stale=any(part.stale for part in parts)))
+
+    if etag is None:
+        response = serialize()
+    else:
+        # Compressed bodies get their own tag ("<etag>-gzip"), as each
+        # encoding is a different byte sequence; any of them revalidates.
+        variants = [etag] + [f"{etag}-{encoding}" for encoding in response_cache.ENCODINGS]
+        matched = [variant for variant in variants if request.if_none_match.contains_weak(variant)]
+        if matched:
+            return_etag = matched[0]
+            response = app.response_class(status=304)
+        else:
+            encoding, body = response_cache.encoded_body(
+                request.endpoint, (request.path, request.query_string, etag), request.accept_encodings,
+                lambda: serialize().get_data())
+            response = app.response_class(body, mimetype='application/json')
+            return_etag = etag
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+                return_etag = f"{etag}-{encoding}"
+        response.vary.add('Accept-Encoding')
+        response.set_etag(return_etag)
+    response.headers['Age'] = str(int(age))
+    return response
+
+@app.after_request
+def add_cache_headers(response):
+    http_cache.add_headers(response, request.endpoint)
+    return response
+
+def stream_format():
+    return event_stream.requested_format(request.args.get('stream'), request.headers.get('Accept'))
+
+def streamed_response(stream_format, sections, outcomes, section):
+    """Stream stage outcomes as event_stream events while they arrive; see event_stream.events."""
+    return Response(event_stream.events(stream_format, sections, outcomes, section),
+                    mimetype=event_stream.STREAM_FORMATS[stream_format], headers=event_stream.STREAM_HEADERS)
+
+def lookup_bios(pairs):
+    """Bios for (name, role) pairs: cached ones at once, the rest BIO_BATCH_CONCURRENCY at a time.
+
+    Returns ({name: entry}, parts): the /api/candidate_bios entry for each
+    name, and the CachedResults they came from.
+    """
+    results = {}
+    errors = {}
+    misses = {}
+    for name, role in pairs:
+        if snapshot_store is not None:
+            results[name] = snapshot_store.lookup('bio', name)
+        elif get_wikipedia_bio.cached(name, role):
+            results[name] = get_wikipedia_bio.lookup(name, role)
+        else:
+            misses[name] = lambda name=name, role=role: get_wikipedia_bio.lookup(name, role)
+
+    if misses:
+        print(f"Fetching {len(misses)} of {len(results) + len(misses)} candidate bios")
+        fetched, errors = run_stages(misses, default_timeout=BIO_BATCH_TIMEOUT,
+                                     max_concurrency=BIO_BATCH_CONCURRENCY)
+        results.update(fetched)
+
+    bios = {}
+    for name, result in results.items():
+        status = 'not_found' if result.value.get('bio') in NOT_FOUND_BIOS else 'ok'
+        bios[name] = dict(result.value, status=status, stale=result.stale)
+    for name, error in errors.items():
+        bios[name] = {'status': 'timeout' if error == 'timeout' else 'error', 'error': error}
+    return bios, list(results.values())
+
 @app.route('/api/elections', methods=['GET'])
 def get_election_data():
     state = request.args.get('state')
@@ -16,22 +156,55 @@ def get_election_data():
     if not state or not district:
         return jsonify({'error': 'State and district are required'}), 400
 
-    try:
-        print(f"Fetching election data for State: {state}, District: {district}")  
-        house_candidates = scrape_house_candidates(state, district)
-        senate_candidates = scrape_senate_candidates(state)
-        voter_info = scrape_voter_info(state)
+    print(f"Fetching election data for State: {state}, District: {district}")  
+    if snapshot_store is not None:
+        stages = {
+            'houseCandidates': lambda: snapshot_store.lookup('house', state, district),
+            'senateCandidates': lambda: snapshot_store.lookup('senate', state),
+            'voterInfo': lambda: snapshot_store.lookup('voter_info', state),
+        }
+    else:
+        stages = {
+            'houseCandidates': lambda: scrape_house_candidates.lookup(state, district),
+            'senateCandidates': lambda: scrape_senate_candidates.lookup(state),
+            'voterInfo': lambda: scrape_voter_info.lookup(state),
+        }
+
+    stream_fmt = stream_format()
+    if stream_fmt:
+        outcomes = iter_graph({name: ((), fn) for name, fn in stages.items()}, ELECTION_STAGE_TIMEOUTS)
+        return streamed_response(stream_fmt, stages, outcomes, election_section)
+
+    if snapshot_store is not None:
+        results = {name: fn() for name, fn in stages.items()}
+        errors = {}
+    else:
+        results, errors = run_stages(stages, ELECTION_STAGE_TIMEOUTS)
 
+    if not results:
+        print(f"Error fetching election data: {errors}")  
+        return jsonify({'error': 'Failed to fetch election data', 'errors': errors}), 500
+
+    response = {
+        'houseCandidates': results['houseCandidates'].value if 'houseCandidates' in results else [],
+        'senateCandidates': results['senateCandidates'].value if 'senateCandidates' in results else [],
+        'voterInfo': results['voterInfo'].value if 'voterInfo' in results else []
+    }
+    if errors:
+        print(f"Election data partially fetched: {errors}")
+        response['errors'] = errors
+    else:
         print("Election data fetched successfully.")  
-        return jsonify({
-            'houseCandidates': house_candidates,
-            'senateCandidates': senate_candidates,
-            'voterInfo': voter_info
-        })
+    if snapshot_store is None:
+        for name, role in ELECTION_BIO_ROLES.items():
+            prefetch.prefetch_bios(response[name], role)
+    return cached_response(response, results.values())
 
-    except Exception as e:
-        print(f"Error fetching election data: {str(e)}")  
-        return jsonify({'error': str(e)}), 500
+def election_section(name, value):
+    """The payload fields for one finished /api/elections part; starts prefetching its candidates' bios."""
+    if snapshot_store is None and name in ELECTION_BIO_ROLES:
+        prefetch.prefetch_bios(value.value, ELECTION_BIO_ROLES[name])
+    return {name: value.value}, [value]
 
 @app.route('/api/municipal_candidates', methods=['GET'])
 def get_municipal_candidates():
@@ -43,9 +216,14 @@ def get_municipal_candidates():
 
     try:
         print(f"Fetching municipal candidates for County: {county}, State: {state}")  
-        results = scrape_municipal_candidates(county, state)
+        if snapshot_store is not None:
+            results = snapshot_store.lookup('municipal', county, state)
+        else:
+            results = scrape_municipal_candidates.lookup(county, state)
         print("Municipal candidates fetched successfully.")  
-        return jsonify(results)  
+        if snapshot_store is None:
+            prefetch.prefetch_bios(results.value.get('candidates', []), 'Candidate')
+        return cached_response(results.value, [results])
     except Exception as e:
         print(f"Error fetching municipal candidates: {str(e)}")  
         return jsonify({'error': str(e)}), 500
@@ -59,11 +237,212 @@ def get_candidate_bio():
         return jsonify({'error': 'Candidate name and role are required'}), 400
 
     try:
-        bio_data = get_wikipedia_bio(name, role)
-        return jsonify(bio_data)
+        if snapshot_store is not None:
+            bio_data = snapshot_store.lookup('bio', name)
+        else:
+            bio_data = get_wikipedia_bio.lookup(name, role)
+        return cached_response(bio_data.value, [bio_data])
     except Exception as e:
         print(f"Error fetching candidate bio: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/candidate_bios', methods=['POST'])
+def get_candidate_bios():
+    """Bios for many candidates at once: {"candidates": [{"name": ..., "role": ...}, ...]}.
+
+    Returns {"bios": {name: entry}}, one entry per distinct name, where
+    entry is the /api/candidate_bio payload plus a 'status' of 'ok',
+    'not_found', 'timeout' or 'error'. Cached bios are answered at once;
+    the rest are fetched BIO_BATCH_CONCURRENCY at a time.
+    """
+    body = request.get_json(silent=True) or {}
+    candidates = body.get('candidates')
+    if not isinstance(candidates, list) or not candidates:
+        return jsonify({'error': 'A list of candidates with name and role is required'}), 400
+    if len(candidates) > BIO_BATCH_LIMIT:
+        return jsonify({'error': f'At most {BIO_BATCH_LIMIT} candidates per request'}), 400
+
+    pairs = {}
+    for candidate in candidates:
+        if isinstance(candidate, dict):
+            name, role = candidate.get('name'), candidate.get('role')
+        elif isinstance(candidate, (list, tuple)) and len(candidate) == 2:
+            name, role = candidate
+        else:
+            name = role = None
+        if not isinstance(name, str) or not isinstance(role, str) or not name or not role:
+            return jsonify({'error': 'Candidate name and role are required'}), 400
+        # Keyed by name in the response, so the first role given for a name wins.
+        pairs.setdefault(normalize_key((name,)), (name, role))
+
+    bios, results = lookup_bios(pairs.values())
+    # A POST; nothing downstream would cache it.
+    return cached_response({'bios': bios}, results, cacheable=False)
+
+@app.route('/api/representatives', methods=['GET'])
+def get_representatives_for_address():
+    """The Civic API representatives response for ?address= or ?division= (an OCD ID).
+
+    Adds 'state', 'district' and 'county', ready to pass to /api/elections
+    and /api/municipal_candidates, and starts those scrapes in the background.
+    """
+    address = request.args.get('address')
+    division = request.args.get('division')
+    if not address and not division:
+        return jsonify({'error': 'Address or division is required'}), 400
+
+    try:
+        if address:
+            results = get_representatives.lookup(address)
+        else:
+            results = get_division_representatives.lookup(division)
+        if results.value is None:
+            return jsonify({'error': 'No representatives found'}), 404
+        if snapshot_store is None:
+            prefetch.prefetch_scrapes(results.value['state'], results.value['district'], results.value['county'])
+        return cached_response(results.value, [results])
+    except Exception as e:
+        print(f"Error fetching representatives: {type(e).__name__}: {e}")
+        return jsonify({'error': 'Failed to fetch representatives'}), 500
+
+def lookup_section(section, scraper, *args):
+    """A scraper's CachedResult, read from the snapshot instead in snapshot mode."""
+    if snapshot_store is not None:
+        return snapshot_store.lookup(section, *args)
+    return scraper.lookup(*args)
+
+def candidate_pairs(candidates, role):
+    pairs = {}
+    for candidate in candidates:
+        if candidate.get('name'):
+            pairs.setdefault(normalize_key((candidate['name'],)), (candidate['name'], role))
+    return list(pairs.values())
+
+def ballot_stages(address=None, state=None, district=None, county=None, bios=True):
+    """The /api/ballot work as a stage graph (see fanout.iter_graph).
+
+    With an address, the scrapes wait on the Civic lookup for their
+    state, district and county; otherwise they all start at once. Each
+    candidate list's bios start as soon as that list is in.
+    """
+    def location(representatives, *fields):
+        # The scraper arguments, from the Civic lookup when there was one.
+        place = representatives.value if representatives is not None else {
+            'state': state, 'district': district, 'county': county}
+        for field in fields:
+            if not place.get(field):
+                raise ValueError(f"No {field} for this address" if address else f"{field.capitalize()} is required")
+        return [place[field] for field in fields]
+
+    def representatives():
+        result = get_representatives.lookup(address)
+        if result.value is None:
+            raise ValueError('No representatives found for this address')
+        return result
+
+    after = ('representatives',) if address else ()
+    stages = {
+        'houseCandidates': (after, lambda **deps: lookup_section(
+            'house', scrape_house_candidates, *location(deps.get('representatives'), 'state', 'district'))),
+        'senateCandidates': (after, lambda **deps: lookup_section(
+            'senate', scrape_senate_candidates, *location(deps.get('representatives'), 'state'))),
+        'voterInfo': (after, lambda **deps: lookup_section(
+            'voter_info', scrape_voter_info, *location(deps.get('representatives'), 'state'))),
+        'municipalCandidates': (after, lambda **deps: lookup_section(
+            'municipal', scrape_municipal_candidates, *location(deps.get('representatives'), 'county', 'state'))),
+    }
+    if address:
+        stages['representatives'] = ((), representatives)
+    if bios:
+        stages['houseBios'] = (('houseCandidates',), lambda houseCandidates: lookup_bios(
+            candidate_pairs(houseCandidates.value, 'Representative')))
+        stages['senateBios'] = (('senateCandidates',), lambda senateCandidates: lookup_bios(
+            candidate_pairs(senateCandidates.value, 'Senator')))
+        stages['municipalBios'] = (('municipalCandidates',), lambda municipalCandidates: lookup_bios(
+            candidate_pairs(municipalCandidates.value.get('candidates', []), 'Candidate')))
+    return stages
+
+def ballot_section(name, value):
+    """The payload fields one finished /api/ballot stage contributes, and the CachedResults behind them."""
+    if name == 'representatives':
+        return {'representatives': value.value, 'state': value.value['state'],
+                'district': value.value['district'], 'county': value.value['county']}, [value]
+    if name == 'municipalCandidates':
+        return {'municipalCandidates': value.value.get('candidates', []),
+                'demographics': value.value.get('demographics', [])}, [value]
+    if name.endswith('Bios'):
+        bios, parts = value
+        return {'bios': bios}, parts
+    return {name: value.value}, [value]
+
+@app.route('/api/ballot', methods=['GET'])
+def get_ballot():
+    """Everything the state and local pages show, for ?address= or ?state=&district=&county=.
+
+    Runs the Civic lookup, election and municipal scrapes and candidate
+    bios as one stage graph, so each starts as soon as its inputs are
+    known. Add bios=0 to leave the bios out. Parts that failed are listed
+    under 'errors'; the rest are still returned. With stream=ndjson or
+    stream=sse each part is sent as it finishes (see event_stream).
+    """
+    address = request.args.get('address')
+    state = request.args.get('state')
+    if not address and not state:
+        return jsonify({'error': 'Address or state is required'}), 400
+
+    # Addresses stay out of the logs.
+    place = 'an address' if address else (state, request.args.get('district'), request.args.get('county'))
+    print(f"Fetching ballot for {place}")
+    stages = ballot_stages(address, state, request.args.get('district'), request.args.get('county'),
+                           bios=request.args.get('bios') != '0')
+    stream_fmt = stream_format()
+    if stream_fmt:
+        return streamed_response(stream_fmt, stages, iter_graph(stages, BALLOT_STAGE_TIMEOUTS), ballot_section)
+
+    results, errors = run_graph(stages, BALLOT_STAGE_TIMEOUTS)
+    if not results:
+        print(f"Error fetching ballot: {errors}")
+        return jsonify({'error': 'Failed to fetch ballot', 'errors': errors}), 500
+
+    response = {
+        'state': state,
+        'district': request.args.get('district'),
+        'county': request.args.get('county'),
+        'houseCandidates': [],
+        'senateCandidates': [],
+        'voterInfo': [],
+        'municipalCandidates': [],
+        'demographics': [],
+        'bios': {},
+    }
+    parts = []
+    for name, value in results.items():
+        fields, section_parts = ballot_section(name, value)
+        bios = fields.pop('bios', {})
+        response['bios'].update(bios)
+        response.update(fields)
+        parts.extend(section_parts)
+    if errors:
+        print(f"Ballot partially fetched: {errors}")
+        response['errors'] = errors
+    bios_complete = all(bio['status'] in ('ok', 'not_found') for bio in response['bios'].values())
+    return cached_response(response, parts, cacheable=bios_complete)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        'snapshot': snapshot_store.stats() if snapshot_store is not None else None,
+        'connectionPools': get_pool_stats(),
+        'pageFetches': get_fetch_stats(),
+        'upstreamLimits': rate_limit.get_stats(),
+        'upstreamBreakers': resilience.get_stats(),
+        'pageCache': page_cache.get_stats(),
+        'parseMemo': get_parse_memo_stats(),
+        'streamedPages': streaming.get_stats(),
+        'prefetch': prefetch.get_stats(),
+        'resultCache': result_cache.get_stats(),
+        'responseCache': response_cache.get_stats()
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,212 @@
+"""ASGI variant of the API, backed by the async scrapers.
+
+Serves the same three routes as app.py with the same JSON (and the same
+streamed mode for /api/elections, asked for with ?stream= or the Accept
+header), but one worker
+holds every in-flight upstream request on a single event loop instead of
+blocking a thread per request. Run it under any ASGI server, e.g.
+
+    uvicorn asgi:app --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import event_stream
+from app import ELECTION_STAGE_TIMEOUTS, snapshot_store
+from async_scrapers import (close_client, get_wikipedia_bio_async, scrape_house_candidates_async,
+                            scrape_municipal_candidates_async, scrape_senate_candidates_async,
+                            scrape_voter_info_async)
+
+
+async def send_json(send, payload, status=200, age=None):
+    body = json.dumps(payload).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        # Same as flask_cors's default in app.py.
+        (b'access-control-allow-origin', b'*'),
+    ]
+    if age is not None:
+        headers.append((b'age', str(int(age)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_cached(send, payload, parts):
+    """Async counterpart of app.cached_response."""
+    age = max((part.age for part in parts), default=0)
+    await send_json(send, dict(payload, stale=any(part.stale for part in parts)), age=age)
+
+
+async def run_stages_async(stages, timeouts):
+    """Await named coroutines together, each under its own timeout. Returns (results, errors)."""
+    names = list(stages)
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(stages[name], timeouts.get(name, 15)) for name in names),
+        return_exceptions=True,
+    )
+    results = {}
+    errors = {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            errors[name] = 'timeout'
+        elif isinstance(outcome, Exception):
+            errors[name] = str(outcome)
+        else:
+            results[name] = outcome
+    return results, errors
+
+
+async def send_events(send, stream_format, stages, timeouts, section):
+    """Async counterpart of app.streamed_response: send each coroutine's section as soon as it settles."""
+    headers = [
+        (b'content-type', event_stream.STREAM_FORMATS[stream_format].encode()),
+        (b'access-control-allow-origin', b'*'),
+    ] + [(name.lower().encode(), value.encode()) for name, value in event_stream.STREAM_HEADERS.items()]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': event_stream.start(stream_format, stages), 'more_body': True})
+
+    async def settle(name, coroutine):
+        try:
+            return name, await asyncio.wait_for(coroutine, timeouts.get(name, 15)), None
+        except asyncio.TimeoutError:
+            return name, None, 'timeout'
+        except Exception as e:
+            return name, None, str(e)
+
+    errors = {}
+    for next_settled in asyncio.as_completed([settle(name, coroutine) for name, coroutine in stages.items()]):
+        name, value, error = await next_settled
+        if error is not None:
+            errors[name] = error
+        body = event_stream.outcome(stream_format, name, value, error, section)
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': event_stream.done(stream_format, errors)})
+
+
+async def ready(value):
+    return value
+
+
+async def get_election_data(params, headers, send):
+    state = params.get('state')
+    district = params.get('district')
+    if not state or not district:
+        return await send_json(send, {'error': 'State and district are required'}, 400)
+
+    print(f"Fetching election data for State: {state}, District: {district}")
+    if snapshot_store is not None:
+        stages = {
+            'houseCandidates': ready(snapshot_store.lookup('house', state, district)),
+            'senateCandidates': ready(snapshot_store.lookup('senate', state)),
+            'voterInfo': ready(snapshot_store.lookup('voter_info', state)),
+        }
+    else:
+        stages = {
+            'houseCandidates': scrape_house_candidates_async(state, district),
+            'senateCandidates': scrape_senate_candidates_async(state),
+            'voterInfo': scrape_voter_info_async(state),
+        }
+
+    stream_format = event_stream.requested_format(params.get('stream'), headers.get('accept'))
+    if stream_format:
+        return await send_events(send, stream_format, stages, ELECTION_STAGE_TIMEOUTS,
+                                 lambda name, value: ({name: value.value}, [value]))
+    results, errors = await run_stages_async(stages, ELECTION_STAGE_TIMEOUTS)
+
+    if not results:
+        print(f"Error fetching election data: {errors}")
+        return await send_json(send, {'error': 'Failed to fetch election data', 'errors': errors}, 500)
+
+    response = {
+        'houseCandidates': results['houseCandidates'].value if 'houseCandidates' in results else [],
+        'senateCandidates': results['senateCandidates'].value if 'senateCandidates' in results else [],
+        'voterInfo': results['voterInfo'].value if 'voterInfo' in results else []
+    }
+    if errors:
+        print(f"Election data partially fetched: {errors}")
+        response['errors'] = errors
+    await send_cached(send, response, results.values())
+
+
+async def get_municipal_candidates(params, headers, send):
+    county = params.get('county')
+    state = params.get('state')
+    if not county or not state:
+        return await send_json(send, {'error': 'County and state are required'}, 400)
+
+    try:
+        if snapshot_store is not None:
+            results = snapshot_store.lookup('municipal', county, state)
+        else:
+            results = await scrape_municipal_candidates_async(county, state)
+        await send_cached(send, results.value, [results])
+    except Exception as e:
+        print(f"Error fetching municipal candidates: {str(e)}")
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def get_candidate_bio(params, headers, send):
+    name = params.get('name')
+    role = params.get('role')
+    if not name or not role:
+        return await send_json(send, {'error': 'Candidate name and role are required'}, 400)
+
+    try:
+        if snapshot_store is not None:
+            bio_data = snapshot_store.lookup('bio', name)
+        else:
+            bio_data = await get_wikipedia_bio_async(name, role)
+        await send_cached(send, bio_data.value, [bio_data])
+    except Exception as e:
+        print(f"Error fetching candidate bio: {str(e)}")
+        await send_json(send, {'error': str(e)}, 500)
+
+
+ROUTES = {
+    '/api/elections': get_election_data,
+    '/api/municipal_candidates': get_municipal_candidates,
+    '/api/candidate_bio': get_candidate_bio,
+}
+
+
+def request_headers(scope):
+    """The request's headers by lowercase name; repeated headers are joined with commas, as HTTP allows."""
+    headers = {}
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get(scope['path'])
+    if handler is None:
+        return await send_json(send, {'error': 'Not found'}, 404)
+    if scope['method'] == 'OPTIONS':
+        return await send_json(send, {})
+    if scope['method'] != 'GET':
+        return await send_json(send, {'error': 'Method not allowed'}, 405)
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    params = {key: values[0] for key, values in query.items()}
+    await handler(params, request_headers(scope), send)
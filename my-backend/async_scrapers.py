@@ -0,0 +1,196 @@
+"""Coroutine versions of the scrapers, for the ASGI app in asgi.py.
+
+They share everything but the I/O with the sync scrapers: the same URL
+builders, the same parse_* functions, the same page cache and the same
+in-process result cache, so a page scraped through either path is a hit
+for both. Parsing and page cache reads and writes run in worker threads, so
+the event loop never blocks on them.
+Each coroutine returns a CachedResult, like the sync scrapers' .lookup().
+"""
+import asyncio
+import os
+
+import httpx
+
+import page_cache
+import resilience
+import streaming
+from http_client import (USER_AGENT, conditional_headers, content_length, serve_stale, store_response,
+                         upstream_url)
+from house_scraper import (HOUSE_SPEC, construct_ballotpedia_url, construct_state_house_url, district_label,
+                           parse_house_candidates, parse_state_house_candidates,
+                           scrape_house_candidates, scrape_state_house_candidates)
+from municipal_scraper import construct_municipal_url, parse_municipal_candidates, scrape_municipal_candidates
+from parsing import memoized_parse
+from rate_limit import QueueTimeout
+from result_cache import CachedResult, value_etag
+from senate_scraper import (SENATE_SPEC, construct_senate_url, construct_voter_info_url, parse_senate_candidates,
+                            parse_voter_info, scrape_senate_candidates, scrape_voter_info)
+from singleflight import file_lock_async
+from streaming import SpecStream
+from wiki import (BIO_SOURCE, construct_wikipedia_api_url, construct_wikipedia_url, get_wikipedia_bio,
+                  parse_wikipedia_bio, parse_wikipedia_extract)
+
+# Upstream connections one event loop may hold open; requests beyond this
+# queue inside the client instead of each needing a thread.
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 200))
+
+TRANSIENT_ERRORS = (httpx.TransportError,)
+
+_clients = {}
+_in_flight = {}
+
+
+def get_client():
+    """The AsyncClient for the running event loop (clients can't be shared across loops)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=20),
+            timeout=httpx.Timeout(resilience.READ_TIMEOUT, connect=resilience.CONNECT_TIMEOUT),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _single_flight(key, make_coroutine):
+    """Await one shared task per key, so concurrent identical calls make one upstream trip."""
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_coroutine())
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def fetch_page_async(url, stream=None):
+    """Async counterpart of http_client.fetch_page: page cache first, then one shared GET."""
+    if not streaming.STREAMING_PARSE:
+        stream = None
+    partial = stream is not None
+    cached = await asyncio.to_thread(page_cache.get, url, partial)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        # As in fetch_page, a worker process that was already fetching the
+        # page leaves it in the shared cache for whoever takes the lock next.
+        async with file_lock_async(url):
+            cached = await asyncio.to_thread(page_cache.get, url, partial)
+            if cached is not None:
+                return cached
+            return await fetch_and_store()
+
+    async def fetch_and_store():
+        stored = await asyncio.to_thread(page_cache.get_validators, url, partial)
+        try:
+            response = await resilience.get_async(get_client(), url, upstream_url(url), TRANSIENT_ERRORS,
+                                                  conditional_headers(stored), stream=True)
+            text = None
+            try:
+                if stream is not None and response.status_code == 200:
+                    encoding = response.encoding or 'utf-8'
+                    body = await streaming.read_async(stream, response.aiter_bytes(), encoding)
+                    streaming.record(stream.page_type, stream.done, response.num_bytes_downloaded,
+                                     content_length(response))
+                    text = body.decode(encoding, errors='replace')
+                else:
+                    await response.aread()
+            finally:
+                await response.aclose()
+        except (resilience.CircuitOpen, QueueTimeout) + TRANSIENT_ERRORS as e:
+            stale = await asyncio.to_thread(serve_stale, url, e, partial)
+            if stale is None:
+                raise
+            return stale
+        return await asyncio.to_thread(store_response, url, stored, response, text, stream)
+
+    return await _single_flight(('page', url, partial), fetch)
+
+
+async def _memoized(sync_scraper, args, compute):
+    """Serve from the sync scraper's result cache, computing a miss with the async pipeline.
+
+    Stale entries go through the sync lookup, which returns them at once and
+    refreshes them on the cache's background threads.
+    """
+    if sync_scraper.cached(*args):
+        return sync_scraper.lookup(*args)
+
+    async def run():
+        value = await compute()
+        sync_scraper.prime(args, value)
+        return value
+
+    value = await _single_flight(('scrape',) + sync_scraper.key(*args), run)
+    return CachedResult(value, 0, False, value_etag(value))
+
+
+async def _scrape(url, parse, empty, *parse_args, stream=None):
+    html = await fetch_page_async(url, stream)
+    if html is None:
+        return empty
+    tree = stream.tree if stream is not None else None
+    return await asyncio.to_thread(memoized_parse, parse, html, *parse_args, tree=tree)
+
+
+async def scrape_state_house_candidates_async(state):
+    async def compute():
+        districts = await _scrape(construct_state_house_url(state), parse_state_house_candidates, {})
+        for district, candidates in districts.items():
+            scrape_house_candidates.prime((state, district), candidates)
+        return districts
+    return await _memoized(scrape_state_house_candidates, (state,), compute)
+
+
+async def scrape_house_candidates_async(state, district):
+    async def compute():
+        districts = (await scrape_state_house_candidates_async(state)).value
+        candidates = districts.get(district_label(district))
+        if candidates:
+            return candidates
+        return await _scrape(construct_ballotpedia_url(state, district), parse_house_candidates, [],
+                             stream=SpecStream(HOUSE_SPEC, 'house'))
+    return await _memoized(scrape_house_candidates, (state, district), compute)
+
+
+async def scrape_senate_candidates_async(state_name):
+    async def compute():
+        return await _scrape(construct_senate_url(state_name), parse_senate_candidates, [], state_name,
+                             stream=SpecStream(SENATE_SPEC, 'senate'))
+    return await _memoized(scrape_senate_candidates, (state_name,), compute)
+
+
+async def scrape_voter_info_async(state_name):
+    async def compute():
+        return await _scrape(construct_voter_info_url(state_name), parse_voter_info, [])
+    return await _memoized(scrape_voter_info, (state_name,), compute)
+
+
+async def scrape_municipal_candidates_async(county, state):
+    async def compute():
+        empty = {'candidates': [], 'demographics': []}
+        return await _scrape(construct_municipal_url(county, state), parse_municipal_candidates, empty)
+    return await _memoized(scrape_municipal_candidates, (county, state), compute)
+
+
+async def get_wikipedia_bio_async(name, role):
+    async def compute():
+        if BIO_SOURCE == 'api':
+            text = await fetch_page_async(construct_wikipedia_api_url(name))
+            if text is not None:
+                bio = await asyncio.to_thread(memoized_parse, parse_wikipedia_extract, text)
+                if bio is not None:
+                    return bio
+        empty = {"bio": "No biography found.", "image_url": None}
+        return await _scrape(construct_wikipedia_url(name), parse_wikipedia_bio, empty)
+    return await _memoized(get_wikipedia_bio, (name, role), compute)
@@ -0,0 +1,81 @@
+"""Compare the two Wikipedia bio sources: the article HTML and the MediaWiki API extract.
+
+Fetches each name both ways straight from Wikipedia (no page or result
+cache) and prints the bytes transferred, fetch and parse latency, and
+whether the two bios agree.
+
+    python bench_bio.py "Ted Cruz" "John Cornyn" "Keith Self"
+
+Bytes are the response body as received; when the server compresses it,
+that is the compressed size.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from http_client import get_session, upstream_url
+from wiki import construct_wikipedia_api_url, construct_wikipedia_url, parse_wikipedia_bio, parse_wikipedia_extract
+
+SOURCES = [
+    ('html', construct_wikipedia_url, parse_wikipedia_bio),
+    ('api', construct_wikipedia_api_url, parse_wikipedia_extract),
+]
+
+
+def fetch(url):
+    started = time.perf_counter()
+    response = get_session().get(upstream_url(url), timeout=30)
+    body = response.content
+    seconds = time.perf_counter() - started
+    wire_bytes = response.raw.tell() or len(body)
+    return response, seconds, wire_bytes
+
+
+def measure(url, parse):
+    response, fetch_seconds, wire_bytes = fetch(url)
+    if response.status_code != 200:
+        return None, fetch_seconds, 0, wire_bytes
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = parse(response.text)
+        parse_seconds = time.perf_counter() - started
+    return result, fetch_seconds, parse_seconds, wire_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', default=['Ted Cruz', 'John Cornyn', 'Keith Self'])
+    args = parser.parse_args()
+
+    totals = {source: [0, 0.0, 0.0] for source, _, _ in SOURCES}
+    print(f"{'name':<24} {'source':<6} {'KB':>8} {'fetch ms':>9} {'parse ms':>9}  bio")
+    print('-' * 75)
+    for name in args.names:
+        results = {}
+        for source, construct_url, parse in SOURCES:
+            result, fetch_seconds, parse_seconds, wire_bytes = measure(construct_url(name), parse)
+            results[source] = result
+            totals[source][0] += wire_bytes
+            totals[source][1] += fetch_seconds
+            totals[source][2] += parse_seconds
+            if source == 'html':
+                verdict = 'reference'
+            elif result is None:
+                verdict = 'unusable, would fall back to html'
+            elif result == results['html']:
+                verdict = 'identical'
+            elif result['image_url'] == (results['html'] or {}).get('image_url'):
+                verdict = 'same image, text differs'
+            else:
+                verdict = 'differs'
+            print(f"{name:<24} {source:<6} {wire_bytes / 1024:>8.1f} {fetch_seconds * 1000:>9.0f} "
+                  f"{parse_seconds * 1000:>9.1f}  {verdict}")
+
+    print('-' * 75)
+    for source, (wire_bytes, fetch_seconds, parse_seconds) in totals.items():
+        print(f"{'total':<24} {source:<6} {wire_bytes / 1024:>8.1f} {fetch_seconds * 1000:>9.0f} {parse_seconds * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
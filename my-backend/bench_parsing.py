@@ -0,0 +1,182 @@
+"""Compare the old full html.parser tree against the lxml + SoupStrainer mode.
+
+Fetches one page of each type (through the page cache), parses it under both
+modes and prints parse time, peak Python memory and whether the outputs match.
+
+    python bench_parsing.py --state Texas --district 3rd --county "Collin County" --name "Ted Cruz"
+
+House, Senate and municipal pages are read with compiled extraction specs
+straight off an lxml tree. For those, the BeautifulSoup loops the specs
+replaced are kept below as reference_* functions: they are timed under both
+parser modes, then the spec is timed and checked against them.
+
+The last row per page is a refresh that finds the page unchanged: the
+parse memo only fingerprints the body and returns the earlier result.
+
+Peak memory is measured with tracemalloc, which sees Python objects such as
+the BeautifulSoup tree but not libxml2's own buffers.
+"""
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+from bs4 import SoupStrainer
+
+import parsing
+from http_client import fetch_page
+from house_scraper import construct_ballotpedia_url, parse_house_candidates
+from municipal_scraper import construct_municipal_url, get_full_party_name, parse_municipal_candidates
+from parsing import make_soup
+from senate_scraper import construct_senate_url, construct_voter_info_url, parse_senate_candidates, parse_voter_info
+from wiki import construct_wikipedia_url, parse_wikipedia_bio
+
+MODES = [
+    ('html.parser, full tree', 'html.parser', False),
+    ('lxml, strained tree', 'lxml', True),
+]
+
+VOTEBOX_TAGS = SoupStrainer(['h5', 'table'])
+
+
+def reference_house_candidates(html):
+    """parse_house_candidates as it was before HOUSE_SPEC."""
+    soup = make_soup(html, VOTEBOX_TAGS)
+    candidates = []
+    general_election_section = soup.find('h5', string=lambda t: 'general election' in t.lower())
+    if general_election_section:
+        results_table = general_election_section.find_next('table')
+        if results_table:
+            for row in results_table.find_all('tr', class_='results_row')[:2]:
+                candidates.append({
+                    'name': row.find('a').get_text(strip=True),
+                    'party': row.find('td', class_='votebox-results-cell--text').get_text(strip=True),
+                    'link': f"https://ballotpedia.org{row.find('a')['href']}"
+                })
+    return candidates
+
+
+def reference_senate_candidates(html, state_name):
+    """parse_senate_candidates as it was before SENATE_SPEC."""
+    soup = make_soup(html, VOTEBOX_TAGS)
+    candidates = []
+    for header in soup.find_all('h5', class_='votebox-header-election-type'):
+        if 'general election' in header.get_text(strip=True).lower():
+            results_table = header.find_next('table')
+            if results_table:
+                for row in results_table.find_all('tr', class_='results_row')[:2]:
+                    candidates.append({
+                        'name': row.find('a').get_text(strip=True),
+                        'party': row.find('td', class_='votebox-results-cell--text').get_text(strip=True),
+                        'link': f"https://ballotpedia.org{row.find('a')['href']}"
+                    })
+                break
+    return candidates
+
+
+def reference_municipal_candidates(html):
+    """parse_municipal_candidates as it was before MUNICIPAL_SPEC and DEMOGRAPHICS_SPEC."""
+    soup = make_soup(html, VOTEBOX_TAGS)
+    candidates = []
+    for header in soup.find_all('h5', class_='votebox-header-election-type'):
+        if 'general election' in header.text.lower():
+            election_name = header.text.strip()
+            candidates_table = header.find_next('table')
+            if candidates_table:
+                for row in candidates_table.find_all('tr', class_='results_row'):
+                    name_link = row.find('td', class_='votebox-results-cell--text').find('a')
+                    if name_link:
+                        party_text = row.find('td', class_='votebox-results-cell--text').text.strip()
+                        party_symbol = party_text.split()[-1].replace("(", "").replace(")", "").strip()
+                        candidates.append({
+                            'name': name_link.text.strip(),
+                            'party': get_full_party_name(party_symbol),
+                            'link': name_link['href'],
+                            'election': election_name
+                        })
+
+    demographics = []
+    demographics_table = soup.find('table', class_='census-table-widget')
+    if demographics_table:
+        for row in demographics_table.find_all('tr'):
+            header = row.find('th', class_='census-table-census-item-header')
+            if header:
+                cells = row.find_all('td', class_='census-table-census-item')
+                if len(cells) == 2:
+                    demographics.append({
+                        'label': header.text.strip(),
+                        'value': f"{cells[0].text.strip()} (Collin County), {cells[1].text.strip()} (Texas)"
+                    })
+    return {'candidates': candidates, 'demographics': demographics}
+
+
+def measure(parse, html, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        result = parse(html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parse(html)
+            best = min(best, time.perf_counter() - started)
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--state', default='Texas')
+    parser.add_argument('--district', default='3rd')
+    parser.add_argument('--county', default='Collin County')
+    parser.add_argument('--name', default='Ted Cruz')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # (page type, url, parse, the BeautifulSoup loop parse replaced or None)
+    pages = [
+        ('house', construct_ballotpedia_url(args.state, args.district), parse_house_candidates,
+         reference_house_candidates),
+        ('senate', construct_senate_url(args.state), lambda html: parse_senate_candidates(html, args.state),
+         lambda html: reference_senate_candidates(html, args.state)),
+        ('voter_info', construct_voter_info_url(args.state), parse_voter_info, None),
+        ('municipal', construct_municipal_url(args.county, args.state), parse_municipal_candidates,
+         reference_municipal_candidates),
+        ('bio', construct_wikipedia_url(args.name), parse_wikipedia_bio, None),
+    ]
+
+    print(f"{'page':<12} {'KB':>7} {'mode':<24} {'ms':>9} {'peak MB':>9}  output")
+    print('-' * 75)
+    for page_type, url, parse, old_parse in pages:
+        html = fetch_page(url)
+        if html is None:
+            print(f"{page_type:<12} skipped, could not fetch {url}")
+            continue
+
+        runs = [(label, old_parse or parse, parser_name, restrict) for label, parser_name, restrict in MODES]
+        if old_parse is not None:
+            runs.append(('extraction spec', parse, 'lxml', True))
+        reference = None
+        for label, run, parser_name, restrict in runs:
+            parsing.PARSER = parser_name
+            parsing.RESTRICT_TREE = restrict
+            result, seconds, peak = measure(run, html, args.repeat)
+            if reference is None:
+                reference = result
+                verdict = 'reference'
+            else:
+                verdict = 'identical' if result == reference else 'DIFFERS'
+            print(f"{page_type:<12} {len(html) / 1024:>7.0f} {label:<24} {seconds * 1000:>9.1f} {peak / 2**20:>9.1f}  {verdict}")
+
+        memoized = lambda html: parsing.memoized_parse(parse, html)
+        with contextlib.redirect_stdout(io.StringIO()):
+            memoized(html)
+        result, seconds, peak = measure(memoized, html, args.repeat)
+        verdict = 'identical' if result == reference else 'DIFFERS'
+        print(f"{page_type:<12} {len(html) / 1024:>7.0f} {'unchanged (memo hit)':<24} {seconds * 1000:>9.1f} {peak / 2**20:>9.1f}  {verdict}")
+
+
+if __name__ == '__main__':
+    main()
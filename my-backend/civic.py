@@ -0,0 +1,165 @@
+"""Google Civic Information API representatives lookups, cached on the backend.
+
+The state, national and local pages all need the same Civic response for
+the user's address. /api/representatives answers them from here, so one
+session makes one Civic call rather than one per page. Addresses are
+normalized before they are cached or sent, so '1 Main St.' and
+'1 main st' are the same lookup. Concurrent lookups for an address share a
+single request (see result_cache.memoize).
+
+Every division in an address response is also cached on its own under its
+OCD ID (ocd-division/country:us/state:tx/cd:3), with just that division's
+offices and officials. /api/representatives?division=... is served from
+there, or from the Civic by-division call on a miss.
+
+CIVIC_API_BASE points the calls at a local stand-in instead, e.g.
+fault_server.py, which answers Civic paths with a sample response:
+
+    python fault_server.py --port 8765
+    CIVIC_API_BASE=http://127.0.0.1:8765/civicinfo/v2 python app.py
+"""
+import os
+import re
+from urllib.parse import quote, urlencode
+
+import requests
+
+import resilience
+from geography import HOUSE_SEATS, STATE_CODES, ordinal
+from http_client import TRANSIENT_ERRORS, get_session, upstream_url
+from result_cache import CIVIC_TTL, memoize
+
+CIVIC_API_BASE = os.environ.get('CIVIC_API_BASE', 'https://www.googleapis.com/civicinfo/v2').rstrip('/')
+
+# Same key the frontend builds with, so one .env serves both.
+CIVIC_API_KEY = os.environ.get('CIVIC_API_KEY') or os.environ.get('REACT_APP_CIVIC_API_KEY')
+
+STREET_SUFFIXES = {
+    'street': 'st',
+    'avenue': 'ave',
+    'road': 'rd',
+    'drive': 'dr',
+    'boulevard': 'blvd',
+    'lane': 'ln',
+    'court': 'ct',
+    'place': 'pl',
+    'parkway': 'pkwy',
+    'highway': 'hwy',
+}
+STREET_SUFFIX = re.compile(r'\b(%s)\b' % '|'.join(STREET_SUFFIXES))
+
+# Division types that play the part of a county for the municipal scraper.
+COUNTY_DIVISION = re.compile(r'/(?:county|parish|borough):[^/]+$')
+STATE_DIVISION = re.compile(r'/state:([a-z]{2})(?:/|$)')
+DISTRICT_DIVISION = re.compile(r'/state:[a-z]{2}/cd:(\d+)$')
+
+
+class CivicAPIError(Exception):
+    pass
+
+
+def normalize_address(address):
+    """'1 Main Street,Plano, TX. USA' -> '1 main st, plano, tx'."""
+    address = re.sub(r'\s+', ' ', str(address)).strip().lower()
+    address = address.replace('.', '')
+    address = re.sub(r'\s*,\s*', ', ', address)
+    address = re.sub(r'(?:,\s*|\s+)(?:usa|us|united states(?: of america)?)$', '', address)
+    address = STREET_SUFFIX.sub(lambda match: STREET_SUFFIXES[match.group(1)], address)
+    return address.strip(' ,')
+
+
+def construct_representatives_url(address=None, division=None):
+    """The Civic URL for an address or division lookup, without the API key (it is added when sending)."""
+    if division is not None:
+        return f"{CIVIC_API_BASE}/representatives/{quote(division, safe='')}"
+    return f"{CIVIC_API_BASE}/representatives?{urlencode({'address': address})}"
+
+
+def fetch_civic(url):
+    """GET a Civic API URL and return the decoded JSON, or None when Civic can't resolve the address or division.
+
+    The key is only put on the URL actually sent, so it never reaches the
+    logs, breakers or limiter. requests puts that URL in its exception
+    messages, so those are replaced with a CivicAPIError naming the redacted
+    URL instead.
+    """
+    fetch_url = upstream_url(url)
+    if CIVIC_API_KEY:
+        fetch_url += ('&' if '?' in fetch_url else '?') + urlencode({'key': CIVIC_API_KEY})
+    try:
+        response = resilience.get(get_session(), url, fetch_url, TRANSIENT_ERRORS)
+    except requests.RequestException as e:
+        raise CivicAPIError(f"Civic API request for {resilience.loggable(url)} failed: {type(e).__name__}") from None
+    if response.status_code in (400, 404):
+        print(f"Civic API could not resolve {resilience.loggable(url)}")
+        return None
+    if response.status_code != 200:
+        raise CivicAPIError(f"Civic API returned status code {response.status_code}")
+    return response.json()
+
+
+def derive_location(data):
+    """The state (full name), House district ('3rd', 'At-Large') and county a Civic response covers.
+
+    These are the arguments the election and municipal scrapers take; any
+    that the response doesn't cover is None.
+    """
+    state = district = county = None
+    for division_id, division in (data.get('divisions') or {}).items():
+        match = STATE_DIVISION.search(division_id)
+        if match and state is None:
+            state = STATE_CODES.get(match.group(1).upper())
+        match = DISTRICT_DIVISION.search(division_id)
+        if match:
+            district = ordinal(int(match.group(1)))
+        if COUNTY_DIVISION.search(division_id):
+            county = division.get('name')
+    if state is None:
+        state = STATE_CODES.get(str((data.get('normalizedInput') or {}).get('state', '')).upper())
+    if state is not None and HOUSE_SEATS.get(state) == 1:
+        district = 'At-Large'
+    return {'state': state, 'district': district, 'county': county}
+
+
+def split_by_division(data):
+    """One response per division in an address response, holding only that division's offices and officials."""
+    offices = data.get('offices') or []
+    officials = data.get('officials') or []
+    responses = {}
+    for division_id, division in (data.get('divisions') or {}).items():
+        division_offices = []
+        division_officials = []
+        for office in offices:
+            if office.get('divisionId') != division_id:
+                continue
+            indices = []
+            for index in office.get('officialIndices', []):
+                if 0 <= index < len(officials):
+                    indices.append(len(division_officials))
+                    division_officials.append(officials[index])
+            division_offices.append(dict(office, officialIndices=indices))
+        responses[division_id] = {
+            'divisions': {division_id: division},
+            'offices': division_offices,
+            'officials': division_officials,
+        }
+    return responses
+
+
+@memoize('civic_address', CIVIC_TTL, key_args=lambda address: (normalize_address(address),), private=True)
+def get_representatives(address):
+    """The Civic representatives response for an address, plus its derived state, district and county."""
+    data = fetch_civic(construct_representatives_url(address=normalize_address(address)))
+    if data is None:
+        return None
+    for division_id, division_data in split_by_division(data).items():
+        get_division_representatives.prime((division_id,), dict(division_data, **derive_location(division_data)))
+    return dict(data, **derive_location(data))
+
+
+@memoize('civic_division', CIVIC_TTL, key_args=lambda division: (division.strip().lower(),))
+def get_division_representatives(division):
+    data = fetch_civic(construct_representatives_url(division=division.strip().lower()))
+    if data is None:
+        return None
+    return dict(data, **derive_location(data))
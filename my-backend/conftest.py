@@ -0,0 +1,46 @@
+"""Fixtures shared by the test modules: a stand-in upstream, a throwaway page cache and rate-limit file."""
+import threading
+
+import pytest
+
+import fault_server
+import http_client
+import page_cache
+import rate_limit
+
+
+@pytest.fixture(autouse=True)
+def shared_buckets(monkeypatch, tmp_path):
+    """Keep every test's shared rate-limit buckets in its own file."""
+    buckets = rate_limit.SharedBuckets(str(tmp_path / 'rate_limit.sqlite3'))
+    monkeypatch.setattr(rate_limit, '_shared', buckets)
+    return buckets
+
+
+@pytest.fixture
+def upstream():
+    """Start a fault_server with the given command-line options; returns it with a url() helper."""
+    servers = []
+
+    def start(*args):
+        options = fault_server.build_parser().parse_args(['--port', '0', '--quiet'] + list(args))
+        server = fault_server.make_server(options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        server.url = lambda path='/page': f"http://127.0.0.1:{server.server_address[1]}{path}"
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """A fresh page cache file for the test."""
+    monkeypatch.setattr(page_cache, 'PAGE_CACHE_ENABLED', True)
+    monkeypatch.setattr(page_cache, 'PAGE_CACHE_PATH', str(tmp_path / 'pages.sqlite3'))
+    monkeypatch.setattr(page_cache, '_local', threading.local())
+    monkeypatch.setattr(http_client, 'UPSTREAM_OVERRIDE', None)
+    return page_cache
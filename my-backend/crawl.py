@@ -0,0 +1,202 @@
+"""Crawl every 2024 election page we know about into one snapshot file.
+
+    python crawl.py                             # writes election_snapshot.json
+    python crawl.py --output snap.json --concurrency 8 --per-host 2 --delay 0.5
+    python crawl.py --counties counties.txt     # extra "County Name, State" lines
+    python crawl.py --no-bios                   # skip the Wikipedia bios of every candidate found
+
+Finished pages are appended to <output>.partial.jsonl as they complete, so
+an interrupted crawl picks up where it stopped when run again. Pages already
+fresh in the page cache are not fetched again.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import page_cache
+from http_client import strict_fetches
+from rate_limit import BACKGROUND, priority
+from geography import KNOWN_COUNTIES, STATES, house_districts
+from house_scraper import construct_state_house_url, scrape_house_candidates
+from municipal_scraper import construct_municipal_url, scrape_municipal_candidates
+from senate_scraper import construct_senate_url, construct_voter_info_url, scrape_senate_candidates, scrape_voter_info
+from snapshot import SNAPSHOT_PATH, snapshot_key, write_snapshot
+from wiki import construct_wikipedia_url, get_wikipedia_bio
+
+
+class HostPoliteness:
+    """Cap concurrent requests per host and space out request starts."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+    def run(self, url, fn):
+        host = urlsplit(url).netloc
+        with self._semaphore(host):
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            return fn()
+
+
+def build_tasks(counties):
+    """(section, args, url, scrape) for every page in the crawl.
+
+    The crawl calls the scrapers unmemoized so it doesn't fill this process's
+    result cache with data that goes straight into the snapshot. The one
+    exception is the statewide House page: the House scraper reads it through
+    scrape_state_house_candidates.lookup, so it is fetched and parsed once
+    per state and then cached for that state's other districts.
+    """
+    tasks = []
+    for state in STATES:
+        tasks.append(('senate', (state,), construct_senate_url(state), scrape_senate_candidates.uncached))
+        tasks.append(('voter_info', (state,), construct_voter_info_url(state), scrape_voter_info.uncached))
+        # Every district is read off one statewide page; the per-district page
+        # is only fetched when the statewide one lacks that district.
+        for district in house_districts(state):
+            tasks.append(('house', (state, district), construct_state_house_url(state), scrape_house_candidates.uncached))
+    for county, state in counties:
+        tasks.append(('municipal', (county, state), construct_municipal_url(county, state), scrape_municipal_candidates.uncached))
+    return tasks
+
+
+def build_bio_tasks(sections):
+    """One Wikipedia bio per distinct candidate found by the election pages."""
+    names = {}
+    for section in ('house', 'senate'):
+        for candidates in sections.get(section, {}).values():
+            for candidate in candidates:
+                names.setdefault(snapshot_key(candidate['name']), candidate['name'])
+    for results in sections.get('municipal', {}).values():
+        for candidate in results['candidates']:
+            names.setdefault(snapshot_key(candidate['name']), candidate['name'])
+
+    # get_wikipedia_bio ignores the role, so the snapshot keys bios by name alone.
+    scrape_bio = lambda name: get_wikipedia_bio.uncached(name, None)
+    return [('bio', (name,), construct_wikipedia_url(name), scrape_bio) for name in names.values()]
+
+
+def read_counties(path):
+    counties = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                county, state = [part.strip() for part in line.rsplit(',', 1)]
+                counties.append((county, state))
+    return counties
+
+
+def load_journal(path):
+    sections = {}
+    if not os.path.exists(path):
+        return sections
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crawl killed mid-write leaves a truncated last line.
+                continue
+            sections.setdefault(entry['section'], {})[entry['key']] = entry['value']
+    return sections
+
+
+def crawl(output, concurrency, per_host, delay, counties, bios=True):
+    journal_path = output + '.partial.jsonl'
+    sections = load_journal(journal_path)
+    politeness = HostPoliteness(per_host, delay)
+
+    failures = run_phase(build_tasks(counties), sections, journal_path, politeness, concurrency)
+    if bios and not failures:
+        failures = run_phase(build_bio_tasks(sections), sections, journal_path, politeness, concurrency)
+
+    if failures:
+        print(f"{failures} pages failed; run again to retry them before a snapshot is written.")
+        return None
+
+    version = write_snapshot(output, sections)
+    os.remove(journal_path)
+    print(f"Wrote snapshot {version} to {output}")
+    return version
+
+
+def run_phase(tasks, sections, journal_path, politeness, concurrency):
+    """Run the tasks not already in the journal, recording each result. Returns the failure count."""
+    tasks = [task for task in tasks if snapshot_key(*task[1]) not in sections.get(task[0], {})]
+    done = sum(len(entries) for entries in sections.values())
+    print(f"Crawling {len(tasks)} pages ({done} already done in {journal_path})")
+
+    def run_task(task):
+        section, args, url, scrape = task
+        # Live API traffic in this process goes ahead of the crawl's fetches,
+        # and a page that fails to load fails the task instead of being
+        # journaled as empty.
+        with priority(BACKGROUND), strict_fetches():
+            if page_cache.get(url, partial=True) is not None:
+                return scrape(*args)
+            return politeness.run(url, lambda: scrape(*args))
+
+    failures = 0
+    with open(journal_path, 'a') as journal, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(run_task, task): task for task in tasks}
+        try:
+            for number, future in enumerate(as_completed(futures), 1):
+                section, args, url, _ = futures[future]
+                try:
+                    value = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f"[{number}/{len(tasks)}] Failed {url}: {str(e)}")
+                    continue
+
+                key = snapshot_key(*args)
+                sections.setdefault(section, {})[key] = value
+                journal.write(json.dumps({'section': section, 'key': key, 'value': value}) + '\n')
+                journal.flush()
+                print(f"[{number}/{len(tasks)}] {section} {', '.join(args)}")
+        except KeyboardInterrupt:
+            print("Interrupted; run again to resume.")
+            for future in futures:
+                future.cancel()
+            raise
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=SNAPSHOT_PATH)
+    parser.add_argument('--concurrency', type=int, default=8, help='pages in flight overall')
+    parser.add_argument('--per-host', type=int, default=2, help='pages in flight per upstream host')
+    parser.add_argument('--delay', type=float, default=0.5, help='seconds between request starts per host')
+    parser.add_argument('--counties', help='file of "County Name, State" lines to crawl besides the known ones')
+    parser.add_argument('--no-bios', dest='bios', action='store_false', help="don't fetch candidate bios")
+    args = parser.parse_args()
+
+    counties = list(KNOWN_COUNTIES)
+    if args.counties:
+        counties += [county for county in read_counties(args.counties) if county not in counties]
+
+    crawl(args.output, args.concurrency, args.per_host, args.delay, counties, args.bios)
+
+
+if __name__ == '__main__':
+    main()
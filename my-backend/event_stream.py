@@ -0,0 +1,81 @@
+"""Streamed responses that send each section of a payload as soon as it is ready.
+
+/api/elections and /api/ballot normally answer once every part is in, so
+one slow page holds up the rest. With ?stream=ndjson or ?stream=sse (or an
+Accept header of application/x-ndjson or text/event-stream) they send
+events instead, one per line for NDJSON or one SSE message each:
+
+    start    {"sections": ["houseCandidates", ...]}
+    section  {"section": "voterInfo", "data": {"voterInfo": [...]}, "stale": false, "age": 0}
+    error    {"section": "senateCandidates", "error": "timeout"}
+    done     {"done": true, "errors": {"senateCandidates": "timeout"}}
+
+data holds the fields the section contributes to the non-streamed
+payload. For NDJSON the event name isn't sent; the keys tell the events
+apart.
+"""
+import json
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+# Keep proxies (nginx in particular) from buffering the stream.
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def requested_format(stream=None, accept=''):
+    """'ndjson' or 'sse' if the request asked for a streamed response, else None."""
+    if stream in STREAM_FORMATS:
+        return stream
+    for stream_format, mimetype in STREAM_FORMATS.items():
+        if mimetype in (accept or ''):
+            return stream_format
+    return None
+
+
+def encode(stream_format, event, payload):
+    body = json.dumps(payload)
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {body}\n\n".encode('utf-8')
+    return (body + '\n').encode('utf-8')
+
+
+def section_event(name, fields, parts):
+    """The section event for a finished part: its payload fields, and the age and staleness of the CachedResults behind them."""
+    return {
+        'section': name,
+        'data': fields,
+        'stale': any(part.stale for part in parts),
+        'age': int(max((part.age for part in parts), default=0)),
+    }
+
+
+def start(stream_format, sections):
+    return encode(stream_format, 'start', {'sections': list(sections)})
+
+
+def outcome(stream_format, name, value, error, section):
+    """The event for one part that settled. section(name, value) returns the payload fields and CachedResults of a part that finished."""
+    if error is not None:
+        return encode(stream_format, 'error', {'section': name, 'error': error})
+    return encode(stream_format, 'section', section_event(name, *section(name, value)))
+
+
+def done(stream_format, errors):
+    return encode(stream_format, 'done', {'done': True, 'errors': errors})
+
+
+def events(stream_format, sections, outcomes, section):
+    """Encode a whole stream: start, an event per (name, value, error) outcome as it arrives, then done."""
+    yield start(stream_format, sections)
+    errors = {}
+    for name, value, error in outcomes:
+        if error is not None:
+            errors[name] = error
+        yield outcome(stream_format, name, value, error, section)
+    yield done(stream_format, errors)
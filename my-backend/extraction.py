@@ -0,0 +1,156 @@
+"""A small declarative extraction engine for Ballotpedia-style pages.
+
+A spec describes where the data lives instead of how to walk to it:
+
+    {
+        'sections': "//h5[...]",            # anchor elements, one per section
+        'first_section_only': True,
+        'section_fields': {'title': text('.')},
+        'table': "following::table[1]",     # relative to each section anchor
+        'rows': ".//tr[...]",                # relative to the table
+        'row_limit': 2,
+        'row_fields': {'name': text('.//a'), 'href': attr('.//a', 'href')},
+        'required': ['name'],                # rows missing these are skipped
+    }
+
+compile_spec() turns every path into an lxml XPath object once, at import
+time, and the compiled Spec is then evaluated against a parsed lxml tree.
+"""
+from lxml import etree
+from lxml import html as lxml_html
+
+_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def has_class(name):
+    """XPath predicate body matching elements whose class list contains name."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def contains_text(needle):
+    """XPath predicate body for a case-insensitive substring match on an element's text."""
+    return f"contains(translate(string(.), '{_UPPER}', '{_LOWER}'), '{needle.lower()}')"
+
+
+def _stripped_text(element):
+    # Same as BeautifulSoup's get_text(strip=True): every text node stripped, then joined.
+    return ''.join(part.strip() for part in element.itertext() if part.strip())
+
+
+def _content_text(element):
+    # Same as BeautifulSoup's .text.strip(): raw text nodes joined, then stripped.
+    return ''.join(element.itertext()).strip()
+
+
+class _Field:
+    def __init__(self, path, reader, attribute=None):
+        self.path = path
+        self.reader = reader
+        self.attribute = attribute
+        self.xpath = None
+
+    def compile(self):
+        self.xpath = etree.XPath(self.path)
+        return self
+
+    def evaluate(self, element):
+        found = self.xpath(element)
+        if not found:
+            return None
+        if self.attribute is not None:
+            return found[0].get(self.attribute)
+        return self.reader(found[0])
+
+
+def text(path):
+    """Field reading the first match's text the way get_text(strip=True) does."""
+    return _Field(path, _stripped_text)
+
+
+def content(path):
+    """Field reading the first match's text the way .text.strip() does."""
+    return _Field(path, _content_text)
+
+
+def attr(path, attribute):
+    """Field reading an attribute of the first match."""
+    return _Field(path, None, attribute)
+
+
+class _ListField(_Field):
+    def evaluate(self, element):
+        return [self.reader(found) for found in self.xpath(element)]
+
+
+def all_content(path):
+    """Field reading .text.strip() of every match, as a list."""
+    return _ListField(path, _content_text)
+
+
+class Spec:
+    def __init__(self, sections, table, rows, row_fields, section_fields=None,
+                 first_section_only=False, row_limit=None, required=()):
+        self.sections = etree.XPath(sections)
+        self.table = etree.XPath(table)
+        self.rows = etree.XPath(rows)
+        self.row_fields = {name: field.compile() for name, field in row_fields.items()}
+        self.section_fields = {name: field.compile() for name, field in (section_fields or {}).items()}
+        self.first_section_only = first_section_only
+        self.row_limit = row_limit
+        self.required = tuple(required)
+
+    def extract(self, tree):
+        """Return one dict per matched section: its section fields plus 'rows' (a list of row dicts)."""
+        sections = []
+        for anchor in self.sections(tree):
+            section = {name: field.evaluate(anchor) for name, field in self.section_fields.items()}
+            section['rows'] = []
+
+            tables = self.table(anchor)
+            if tables:
+                rows = self.rows(tables[0])
+                if self.row_limit is not None:
+                    rows = rows[:self.row_limit]
+                for row in rows:
+                    values = {name: field.evaluate(row) for name, field in self.row_fields.items()}
+                    if all(values[name] is not None for name in self.required):
+                        section['rows'].append(values)
+            section['has_table'] = bool(tables)
+
+            sections.append(section)
+            if self.first_section_only:
+                break
+        return sections
+
+
+def compile_spec(spec):
+    return Spec(**spec)
+
+
+def parse_tree(html):
+    """Parse a page into an lxml tree once, for evaluating any number of specs against it.
+
+    A tree that was already built (see streaming.py) is returned as it is.
+    """
+    if isinstance(html, etree._Element):
+        return html
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that still carries an XML encoding declaration.
+        return lxml_html.document_fromstring(html.encode('utf-8'))
+
+
+# The general-election votebox shared by the House, Senate and municipal pages:
+# the election-type header, the next results table, and the candidate rows in it.
+VOTEBOX_ROWS = f".//tr[{has_class('results_row')}]"
+VOTEBOX_TABLE = 'following::table[1]'
+VOTEBOX_CANDIDATE_CELL = f".//td[{has_class('votebox-results-cell--text')}]"
+
+# Name, profile link and the "Name (P)" cell of a candidate row.
+VOTEBOX_CANDIDATE_FIELDS = {
+    'name': text('.//a'),
+    'href': attr('.//a', 'href'),
+    'party': text(VOTEBOX_CANDIDATE_CELL),
+}
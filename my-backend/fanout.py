@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 16))
+GRAPH_WORKERS = int(os.environ.get('GRAPH_WORKERS', 16))
+DEFAULT_STAGE_TIMEOUT = 15
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+
+# Graph stages may themselves fan out with run_stages and wait on the
+# results. They run on their own pool so a waiting stage never holds a
+# worker the work it waits on needs.
+_graph_executor = ThreadPoolExecutor(max_workers=GRAPH_WORKERS, thread_name_prefix='graph')
+
+
+def _submit_bounded(stages, limit):
+    """Submit stages so that at most limit of them run at once; returns a Future per stage."""
+    futures = {}
+    pending = deque()
+    for name, fn in stages.items():
+        future = Future()
+        futures[name] = future
+        pending.append((future, fn))
+    lock = threading.Lock()
+
+    def launch():
+        with lock:
+            while pending:
+                future, fn = pending.popleft()
+                # False when the caller already gave up on (cancelled) this stage.
+                if future.set_running_or_notify_cancel():
+                    break
+            else:
+                return
+        _executor.submit(run, future, fn)
+
+    def run(future, fn):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            launch()
+
+    for _ in range(min(limit, len(pending))):
+        launch()
+    return futures
+
+
+def run_stages(stages, timeouts=None, default_timeout=DEFAULT_STAGE_TIMEOUT, max_concurrency=None):
+    """Run named zero-argument callables concurrently.
+
+    Every stage gets its own deadline measured from the moment the batch was
+    submitted. Returns ``(results, errors)``: results holds the stages that
+    finished in time, errors maps each failed stage to 'timeout' or the
+    exception message. With max_concurrency, only that many stages of the
+    batch run at once and the rest wait their turn (against the same
+    deadlines).
+    """
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    if max_concurrency is None:
+        futures = {name: _executor.submit(fn) for name, fn in stages.items()}
+    else:
+        futures = _submit_bounded(stages, max_concurrency)
+
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        remaining = timeouts.get(name, default_timeout) - (time.monotonic() - started)
+        try:
+            results[name] = future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            # The worker thread can't be interrupted; it finishes in the
+            # background and its result is dropped.
+            future.cancel()
+            errors[name] = 'timeout'
+        except Exception as e:
+            errors[name] = str(e)
+    return results, errors
+
+
+def iter_graph(stages, timeouts=None, default_timeout=DEFAULT_STAGE_TIMEOUT):
+    """Run stages that depend on each other's results, yielding (name, value, error) as each settles.
+
+    stages maps a name to (dependencies, fn). A stage starts as soon as
+    every stage it depends on has succeeded, and fn is called with their
+    results as keyword arguments. error is None on success, 'timeout',
+    'error' when fn raised (the exception itself is only logged, since its
+    message can carry upstream URLs), or, for a stage that never ran because
+    a dependency didn't succeed, '<dependency> failed'. Deadlines are
+    measured from the start of the run, as in run_stages, so a stage that
+    waits on others needs a longer timeout than they have.
+    """
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    deadlines = {name: started + timeouts.get(name, default_timeout) for name in stages}
+    done = queue.Queue()
+    results = {}
+    settled = set()
+    running = set()
+
+    def run(name, fn, kwargs):
+        try:
+            done.put((name, fn(**kwargs), None))
+        except Exception as e:
+            print(f"Stage {name} failed: {type(e).__name__}: {e}")
+            done.put((name, None, 'error'))
+
+    def start_ready():
+        # Returns the stages settled here because a dependency didn't succeed.
+        skipped = []
+        progress = True
+        while progress:
+            progress = False
+            for name, (dependencies, fn) in stages.items():
+                if name in settled or name in running or not all(dep in settled for dep in dependencies):
+                    continue
+                failed = [dep for dep in dependencies if dep not in results]
+                if failed:
+                    settled.add(name)
+                    skipped.append((name, None, f"{failed[0]} failed"))
+                    progress = True
+                else:
+                    running.add(name)
+                    _graph_executor.submit(run, name, fn, {dep: results[dep] for dep in dependencies})
+        return skipped
+
+    outcomes = start_ready()
+    while True:
+        yield from outcomes
+        if len(settled) == len(stages):
+            return
+        waiting = running - settled
+        if not waiting:
+            raise ValueError(f"Stages with unknown or circular dependencies: {sorted(set(stages) - settled)}")
+
+        try:
+            name, value, error = done.get(timeout=max(min(deadlines[name] for name in waiting) - time.monotonic(), 0))
+        except queue.Empty:
+            # As in run_stages, a timed-out stage keeps running and its result is dropped.
+            now = time.monotonic()
+            outcomes = [(name, None, 'timeout') for name in waiting if deadlines[name] <= now]
+            settled.update(name for name, _, _ in outcomes)
+            outcomes += start_ready()
+            continue
+        if name in settled:
+            outcomes = []
+            continue
+        settled.add(name)
+        if error is None:
+            results[name] = value
+        outcomes = [(name, value, error)] + start_ready()
+
+
+def run_graph(stages, timeouts=None, default_timeout=DEFAULT_STAGE_TIMEOUT):
+    """Run a stage graph (see iter_graph) to the end. Returns (results, errors) like run_stages."""
+    results = {}
+    errors = {}
+    for name, value, error in iter_graph(stages, timeouts, default_timeout):
+        if error is None:
+            results[name] = value
+        else:
+            errors[name] = error
+    return results, errors
@@ -0,0 +1,180 @@
+"""Local stand-in for Ballotpedia/Wikipedia that injects delays and errors.
+
+Point the backend at it to watch the timeouts, retries, circuit breakers
+and rate limiter work without touching the real sites:
+
+    python fault_server.py --port 8765 --pages sample_pages/ --error-rate 0.3 --delay 0.5
+    UPSTREAM_OVERRIDE=http://127.0.0.1:8765 PAGE_CACHE_ENABLED=0 python app.py
+
+Every request is answered with the saved page named after its path with
+'/' turned into '_' (/wiki/Keith_Self is read from sample_pages/wiki_Keith_Self),
+or with a placeholder page when there is no such file. Breaker and retry
+counters show up under upstreamBreakers in /api/stats.
+
+Civic API paths (/civicinfo/v2/representatives) are answered with
+SAMPLE_CIVIC, or the JSON file given with --civic-response, for any
+address; set CIVIC_API_BASE=http://127.0.0.1:8765/civicinfo/v2.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+PLACEHOLDER = '<html><body><p>Stand-in page for {path}</p></body></html>'
+
+# A trimmed Civic representatives response for an address in Plano, TX.
+SAMPLE_CIVIC = {
+    'kind': 'civicinfo#representativeInfoResponse',
+    'normalizedInput': {'line1': '1 Main St', 'city': 'Plano', 'state': 'TX', 'zip': '75074'},
+    'divisions': {
+        'ocd-division/country:us': {'name': 'United States', 'officeIndices': [0]},
+        'ocd-division/country:us/state:tx': {'name': 'Texas', 'officeIndices': [1, 2]},
+        'ocd-division/country:us/state:tx/cd:3': {'name': "Texas's 3rd congressional district", 'officeIndices': [3]},
+        'ocd-division/country:us/state:tx/county:collin': {'name': 'Collin County', 'officeIndices': [4]},
+    },
+    'offices': [
+        {'name': 'President of the United States', 'divisionId': 'ocd-division/country:us',
+         'levels': ['country'], 'officialIndices': [0]},
+        {'name': 'U.S. Senator', 'divisionId': 'ocd-division/country:us/state:tx',
+         'levels': ['country'], 'officialIndices': [1, 2]},
+        {'name': 'Governor of Texas', 'divisionId': 'ocd-division/country:us/state:tx',
+         'levels': ['administrativeArea1'], 'officialIndices': [3]},
+        {'name': 'U.S. Representative', 'divisionId': 'ocd-division/country:us/state:tx/cd:3',
+         'levels': ['country'], 'officialIndices': [4]},
+        {'name': 'Collin County Judge', 'divisionId': 'ocd-division/country:us/state:tx/county:collin',
+         'levels': ['administrativeArea2'], 'officialIndices': [5]},
+    ],
+    'officials': [
+        {'name': 'Joseph R. Biden', 'party': 'Democratic Party'},
+        {'name': 'John Cornyn', 'party': 'Republican Party'},
+        {'name': 'Ted Cruz', 'party': 'Republican Party'},
+        {'name': 'Greg Abbott', 'party': 'Republican Party'},
+        {'name': 'Keith Self', 'party': 'Republican Party'},
+        {'name': 'Chris Hill', 'party': 'Republican Party'},
+    ],
+}
+
+
+class FaultHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        options = self.server.options
+        with self.server.lock:
+            self.server.requests += 1
+            number = self.server.requests
+
+        if options.delay:
+            time.sleep(options.delay)
+        if random.random() < options.hang_rate:
+            # Longer than the backend's read timeout.
+            time.sleep(options.hang_seconds)
+
+        if number <= options.fail_first or random.random() < options.error_rate:
+            status = options.error_status
+            body = f'Injected {status}'.encode()
+        elif '/civicinfo/' in self.path:
+            status, body = self._civic()
+        else:
+            status = 200
+            body = self._page().encode('utf-8')
+
+        etag = None
+        if status == 200 and options.validators:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                status = 304
+                body = b''
+
+        self.send_response(status)
+        content_type = 'application/json' if '/civicinfo/' in self.path else 'text/html'
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.server.started)
+        if status == 429 and options.retry_after:
+            self.send_header('Retry-After', str(options.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self):
+        pages = self.server.options.pages
+        path = self.path.split('?', 1)[0]
+        if pages:
+            name = path.strip('/').replace('/', '_')
+            file_path = os.path.join(pages, name)
+            if os.path.isfile(file_path):
+                with open(file_path, encoding='utf-8') as f:
+                    return f.read()
+        return PLACEHOLDER.format(path=path)
+
+    def _civic(self):
+        """Status and JSON body for a Civic representatives call, by address or by division."""
+        options = self.server.options
+        data = SAMPLE_CIVIC
+        if options.civic_response:
+            with open(options.civic_response, encoding='utf-8') as f:
+                data = json.load(f)
+
+        url = urlsplit(self.path)
+        division = unquote(url.path.split('/representatives/', 1)[1]) if '/representatives/' in url.path else None
+        if division is not None:
+            if division not in data['divisions']:
+                return 404, json.dumps({'error': {'code': 404, 'message': 'Division not found'}}).encode()
+            offices = [dict(office) for office in data['offices'] if office['divisionId'] == division]
+            officials = []
+            for office in offices:
+                indices = office['officialIndices']
+                office['officialIndices'] = list(range(len(officials), len(officials) + len(indices)))
+                officials.extend(data['officials'][index] for index in indices)
+            data = {'divisions': {division: data['divisions'][division]}, 'offices': offices, 'officials': officials}
+        elif not parse_qs(url.query).get('address'):
+            return 400, json.dumps({'error': {'code': 400, 'message': 'Failed to parse address'}}).encode()
+        return 200, json.dumps(data).encode()
+
+    def log_message(self, format, *args):
+        if not self.server.options.quiet:
+            super().log_message(format, *args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', help='directory of saved pages to serve')
+    parser.add_argument('--delay', type=float, default=0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--fail-first', type=int, default=0, help='fail this many requests, then recover')
+    parser.add_argument('--hang-rate', type=float, default=0, help='fraction of requests that stall')
+    parser.add_argument('--hang-seconds', type=float, default=30)
+    parser.add_argument('--validators', action='store_true', help='send ETags and answer If-None-Match with 304')
+    parser.add_argument('--civic-response', help='JSON file to answer Civic API calls with instead of SAMPLE_CIVIC')
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def make_server(options):
+    """A server for parsed options, not yet serving. --port 0 picks a free port (see server_address)."""
+    server = ThreadingHTTPServer(('127.0.0.1', options.port), FaultHandler)
+    server.options = options
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.started = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())
+    return server
+
+
+def main():
+    server = make_server(build_parser().parse_args())
+    print(f"Serving stand-in upstream on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Content fingerprints of fetched pages that ignore markup which changes on every render.
+
+MediaWiki pages (Ballotpedia and Wikipedia both run it) differ between two
+fetches of the same revision: request IDs, parser-cache timestamps and CPU
+time reports in comments and inline scripts, CSP nonces, cache-busting
+query strings on stylesheets and tracking parameters on links. None of it
+is read by the parsers, so it is stripped before hashing. Two bodies with
+the same fingerprint then parse to the same output, and the page cache and
+parse memo treat them as unchanged.
+"""
+import hashlib
+import re
+
+VOLATILE_PATTERNS = [
+    # Comments: "NewPP limit report", "Saved in parser cache with key ... timestamp ...".
+    re.compile(r'<!--.*?-->', re.S),
+    # Inline scripts and styles carry RLCONF (wgRequestId, wgBackendResponseTime), ads config and nonces.
+    re.compile(r'<script\b[^>]*>.*?</script\s*>', re.S | re.I),
+    re.compile(r'<style\b[^>]*>.*?</style\s*>', re.S | re.I),
+    re.compile(r'<noscript\b[^>]*>.*?</noscript\s*>', re.S | re.I),
+    # Stylesheet/preload links and meta tags, with their version query strings.
+    re.compile(r'<(?:link|meta)\b[^>]*>', re.I),
+    re.compile(r'\snonce="[^"]*"', re.I),
+]
+
+# Analytics parameters on links; the link targets themselves are kept.
+TRACKING_PARAM = re.compile(r'(?<=[?&;])(?:utm_\w+|fbclid|gclid)=[^&"\'\s>]*(?:&amp;|&)?', re.I)
+
+
+def normalize(html):
+    for pattern in VOLATILE_PATTERNS:
+        html = pattern.sub('', html)
+    return TRACKING_PARAM.sub('', html)
+
+
+def fingerprint(html):
+    """SHA-256 of the page with its volatile markup removed."""
+    return hashlib.sha256(normalize(html).encode('utf-8')).hexdigest()
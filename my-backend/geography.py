@@ -0,0 +1,132 @@
+# U.S. House seats per state after the 2020 census, which apply to the 2024 elections.
+HOUSE_SEATS = {
+    'Alabama': 7,
+    'Alaska': 1,
+    'Arizona': 9,
+    'Arkansas': 4,
+    'California': 52,
+    'Colorado': 8,
+    'Connecticut': 5,
+    'Delaware': 1,
+    'Florida': 28,
+    'Georgia': 14,
+    'Hawaii': 2,
+    'Idaho': 2,
+    'Illinois': 17,
+    'Indiana': 9,
+    'Iowa': 4,
+    'Kansas': 4,
+    'Kentucky': 6,
+    'Louisiana': 6,
+    'Maine': 2,
+    'Maryland': 8,
+    'Massachusetts': 9,
+    'Michigan': 13,
+    'Minnesota': 8,
+    'Mississippi': 4,
+    'Missouri': 8,
+    'Montana': 2,
+    'Nebraska': 3,
+    'Nevada': 4,
+    'New Hampshire': 2,
+    'New Jersey': 12,
+    'New Mexico': 3,
+    'New York': 26,
+    'North Carolina': 14,
+    'North Dakota': 1,
+    'Ohio': 15,
+    'Oklahoma': 5,
+    'Oregon': 6,
+    'Pennsylvania': 17,
+    'Rhode Island': 2,
+    'South Carolina': 7,
+    'South Dakota': 1,
+    'Tennessee': 9,
+    'Texas': 38,
+    'Utah': 4,
+    'Vermont': 1,
+    'Virginia': 11,
+    'Washington': 10,
+    'West Virginia': 2,
+    'Wisconsin': 8,
+    'Wyoming': 1,
+}
+
+STATES = list(HOUSE_SEATS)
+
+# Postal codes, as they appear in Civic division IDs (state:tx) and normalizedInput.
+STATE_CODES = {
+    'AL': 'Alabama',
+    'AK': 'Alaska',
+    'AZ': 'Arizona',
+    'AR': 'Arkansas',
+    'CA': 'California',
+    'CO': 'Colorado',
+    'CT': 'Connecticut',
+    'DE': 'Delaware',
+    'FL': 'Florida',
+    'GA': 'Georgia',
+    'HI': 'Hawaii',
+    'ID': 'Idaho',
+    'IL': 'Illinois',
+    'IN': 'Indiana',
+    'IA': 'Iowa',
+    'KS': 'Kansas',
+    'KY': 'Kentucky',
+    'LA': 'Louisiana',
+    'ME': 'Maine',
+    'MD': 'Maryland',
+    'MA': 'Massachusetts',
+    'MI': 'Michigan',
+    'MN': 'Minnesota',
+    'MS': 'Mississippi',
+    'MO': 'Missouri',
+    'MT': 'Montana',
+    'NE': 'Nebraska',
+    'NV': 'Nevada',
+    'NH': 'New Hampshire',
+    'NJ': 'New Jersey',
+    'NM': 'New Mexico',
+    'NY': 'New York',
+    'NC': 'North Carolina',
+    'ND': 'North Dakota',
+    'OH': 'Ohio',
+    'OK': 'Oklahoma',
+    'OR': 'Oregon',
+    'PA': 'Pennsylvania',
+    'RI': 'Rhode Island',
+    'SC': 'South Carolina',
+    'SD': 'South Dakota',
+    'TN': 'Tennessee',
+    'TX': 'Texas',
+    'UT': 'Utah',
+    'VT': 'Vermont',
+    'VA': 'Virginia',
+    'WA': 'Washington',
+    'WV': 'West Virginia',
+    'WI': 'Wisconsin',
+    'WY': 'Wyoming',
+}
+
+# Counties whose Ballotpedia municipal election page we know exists. The
+# crawler can be given more with --counties.
+KNOWN_COUNTIES = [
+    ('Collin County', 'Texas'),
+]
+
+
+def ordinal(number):
+    """1 -> '1st', 12 -> '12th', 23 -> '23rd', matching the district names Civic and Ballotpedia use."""
+    if 10 <= number % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f"{number}{suffix}"
+
+
+def house_districts(state):
+    """District labels for a state as the House scraper expects them ('At-Large' for single-seat states)."""
+    seats = HOUSE_SEATS[state]
+    if seats == 1:
+        return ['At-Large']
+    return [ordinal(number) for number in range(1, seats + 1)]
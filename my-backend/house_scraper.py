@@ -1,5 +1,46 @@
-import requests
-from bs4 import BeautifulSoup
+import re
+
+from extraction import VOTEBOX_CANDIDATE_FIELDS, VOTEBOX_ROWS, VOTEBOX_TABLE, compile_spec, contains_text, content, has_class, parse_tree
+from geography import ordinal
+from http_client import fetch_page
+from parsing import memoized_parse
+from result_cache import ELECTION_TTL, memoize
+from streaming import SpecStream
+
+# First h5 mentioning the general election, then the first 2 candidates in the table after it.
+HOUSE_SPEC = compile_spec({
+    'sections': f"//h5[{contains_text('general election')}]",
+    'first_section_only': True,
+    'table': VOTEBOX_TABLE,
+    'rows': VOTEBOX_ROWS,
+    'row_limit': 2,
+    'row_fields': VOTEBOX_CANDIDATE_FIELDS,
+    'required': ['name', 'href', 'party'],
+})
+
+# Every district's general-election votebox on the statewide House page.
+STATE_HOUSE_SPEC = compile_spec({
+    'sections': f"//h5[{has_class('votebox-header-election-type')}][{contains_text('general election for u.s. house')}]",
+    'section_fields': {'title': content('.')},
+    'table': VOTEBOX_TABLE,
+    'rows': VOTEBOX_ROWS,
+    'row_limit': 2,
+    'row_fields': VOTEBOX_CANDIDATE_FIELDS,
+    'required': ['name', 'href', 'party'],
+})
+
+def district_label(district):
+    """Canonical district name: '3', '3rd' and 'District 3' all become '3rd'; at-large seats become 'At-Large'."""
+    match = re.search(r'\d+', str(district))
+    if match:
+        return ordinal(int(match.group()))
+    if 'large' in str(district).lower():
+        return 'At-Large'
+    return None
+
+def construct_state_house_url(state):
+    state_formatted = state.replace(" ", "_")
+    return f"https://ballotpedia.org/United_States_House_of_Representatives_elections_in_{state_formatted},_2024"
 
 def construct_ballotpedia_url(state, district):
     
@@ -13,39 +54,75 @@ def construct_ballotpedia_url(state, district):
     
     return url
 
-def scrape_house_candidates(state, district):
-    ballotpedia_url = construct_ballotpedia_url(state, district)
-    response = requests.get(ballotpedia_url)
-
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        candidates = []
-
-        
-        general_election_section = soup.find('h5', text=lambda t: 'general election' in t.lower())
-        if general_election_section:
-            results_table = general_election_section.find_next('table')
-            if results_table:
-                candidate_rows = results_table.find_all('tr', class_='results_row')[:2]  # First 2 candidates
-                for row in candidate_rows:
-                    candidate_name = row.find('a').get_text(strip=True)
-                    candidate_link = row.find('a')['href']
-                    candidate_party = row.find('td', class_='votebox-results-cell--text').get_text(strip=True)
-
-                    candidates.append({
-                        'name': candidate_name,
-                        'party': candidate_party,
-                        'link': f"https://ballotpedia.org{candidate_link}"
-                    })
-            else:
-                print("No general election candidate information found.")
+def parse_house_candidates(html):
+    sections = HOUSE_SPEC.extract(parse_tree(html))
+
+    candidates = []
+
+    if sections:
+        if sections[0]['has_table']:
+            for row in sections[0]['rows']:
+                candidates.append({
+                    'name': row['name'],
+                    'party': row['party'],
+                    'link': f"https://ballotpedia.org{row['href']}"
+                })
         else:
-            print("No general election section found.")
+            print("No general election candidate information found.")
+    else:
+        print("No general election section found.")
+
+    return candidates
+
+def parse_state_house_candidates(html):
+    """Map each district label to its first 2 general-election candidates."""
+    districts = {}
+    for section in STATE_HOUSE_SPEC.extract(parse_tree(html)):
+        title = section['title'] or ''
+        if 'special' in title.lower():
+            continue
+        district = district_label(title.rsplit('House', 1)[-1])
+        if district is None or district in districts or not section['rows']:
+            continue
+        districts[district] = [{
+            'name': row['name'],
+            'party': row['party'],
+            'link': f"https://ballotpedia.org{row['href']}"
+        } for row in section['rows']]
+    return districts
+
+@memoize('house_state', ELECTION_TTL)
+def scrape_state_house_candidates(state):
+    """Parse the statewide House page once and fill the per-district cache for every district on it."""
+    html = fetch_page(construct_state_house_url(state))
+    if html is None:
+        return {}
+
+    districts = memoized_parse(parse_state_house_candidates, html)
+    for district, candidates in districts.items():
+        scrape_house_candidates.prime((state, district), candidates)
+    return districts
 
+@memoize('house', ELECTION_TTL)
+def scrape_house_candidates(state, district):
+    # A stale statewide entry is served as is while it revalidates in the
+    # background, which primes this district again when it lands and keeps
+    # the old districts if the refetch comes back empty.
+    districts = scrape_state_house_candidates.lookup(state).value
+
+    candidates = districts.get(district_label(district))
+    if candidates:
         return candidates
+
+    # The statewide page doesn't list this district; use its own page.
+    ballotpedia_url = construct_ballotpedia_url(state, district)
+    # Only the first general-election votebox is read, so stop downloading after it.
+    stream = SpecStream(HOUSE_SPEC, 'house')
+    html = fetch_page(ballotpedia_url, stream)
+
+    if html is not None:
+        return memoized_parse(parse_house_candidates, html, tree=stream.tree)
     else:
-        print(f"Failed to access {ballotpedia_url}")
         return []
 
 
@@ -0,0 +1,76 @@
+"""ETags, 304s and Cache-Control for the Flask API, so browsers and a CDN can reuse responses.
+
+A response's ETag is built from the etags of the cached results it was
+assembled from (result_cache.value_etag, or the snapshot version in
+snapshot mode) and their stale flags, not from the response body. A
+request whose If-None-Match still matches gets a 304 before anything is
+serialized. Compressed bodies (see response_cache) carry the tag with the
+encoding appended.
+
+Only complete responses are tagged. One with a failed part ('errors', or
+a bio that timed out) and any error status get Cache-Control: no-store, so
+the next request tries again.
+
+Each route's max-age and stale-while-revalidate can be set with
+<ROUTE>_MAX_AGE and <ROUTE>_STALE_WHILE_REVALIDATE, e.g. ELECTIONS_MAX_AGE.
+max-age counts from when the data was scraped (the Age header), so a
+shared cache keeps the response for max-age seconds from when it gets it.
+Routes that take an address are private: browsers may cache them but
+shared caches may not.
+"""
+import hashlib
+import json
+import os
+
+
+def route_policy(name, max_age, stale_while_revalidate, private=False, vary=()):
+    return {
+        'max_age': int(os.environ.get(f'{name}_MAX_AGE', max_age)),
+        'stale_while_revalidate': int(os.environ.get(f'{name}_STALE_WHILE_REVALIDATE', stale_while_revalidate)),
+        'private': private,
+        'vary': vary,
+    }
+
+
+# Keyed by Flask endpoint (view function) name. Routes that stream when
+# asked to by the Accept header (see event_stream) vary on it.
+ROUTE_POLICIES = {
+    'get_election_data': route_policy('ELECTIONS', 300, 3600, vary=('Accept',)),
+    'get_municipal_candidates': route_policy('MUNICIPAL', 300, 3600),
+    'get_candidate_bio': route_policy('BIO', 3600, 24 * 3600),
+    'get_representatives_for_address': route_policy('REPRESENTATIVES', 3600, 24 * 3600, private=True),
+    'get_ballot': route_policy('BALLOT', 300, 3600, private=True, vary=('Accept',)),
+}
+
+NO_STORE = 'no-store'
+
+
+def response_etag(parts):
+    """Strong ETag for a response assembled from CachedResults, or None if any part's content is unknown."""
+    if any(part.etag is None for part in parts):
+        return None
+    signature = sorted((part.etag, part.stale) for part in parts)
+    return hashlib.sha256(json.dumps(signature).encode('utf-8')).hexdigest()[:32]
+
+
+def add_headers(response, endpoint):
+    """Cache-Control (and Vary) for a finished response: the route's policy if it was tagged, otherwise no-store."""
+    if 'Cache-Control' in response.headers:
+        return
+    policy = ROUTE_POLICIES.get(endpoint)
+    if policy is None or response.status_code not in (200, 304) or response.get_etag()[0] is None:
+        response.headers['Cache-Control'] = NO_STORE
+        return
+    response.headers['Cache-Control'] = cache_control(policy, response.headers.get('Age', 0))
+    for header in policy['vary']:
+        response.vary.add(header)
+
+
+def cache_control(policy, age=0):
+    directives = [
+        'private' if policy['private'] else 'public',
+        f"max-age={int(age) + policy['max_age']}",
+    ]
+    if policy['stale_while_revalidate']:
+        directives.append(f"stale-while-revalidate={policy['stale_while_revalidate']}")
+    return ', '.join(directives)
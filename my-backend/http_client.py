@@ -0,0 +1,240 @@
+import contextlib
+import contextvars
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import page_cache
+import resilience
+import streaming
+from rate_limit import QueueTimeout
+from singleflight import SingleFlight, file_lock
+
+# Each gunicorn worker is its own process with its own session, so the pools
+# only need to cover the threads inside one worker.
+POOL_SIZE = int(os.environ.get('SCRAPER_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 10)))
+
+POOLED_HOSTS = [
+    'https://ballotpedia.org',
+    'https://en.wikipedia.org',
+    'https://www.googleapis.com',
+]
+
+USER_AGENT = 'CivicCompass/1.0 (+https://github.com/SakethSripada/CongressionalAppChallenge2024)'
+
+# Send every upstream request to this origin instead, e.g. a local stand-in
+# server (see fault_server.py). Cache keys, limits and breakers still use the
+# real URL.
+UPSTREAM_OVERRIDE = os.environ.get('UPSTREAM_OVERRIDE')
+
+# Request failures worth retrying: the host may answer next time.
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# Statuses that mean the page doesn't exist, as opposed to failing to load.
+MISSING_STATUSES = {404, 410}
+
+_session = None
+_session_lock = threading.Lock()
+_strict = contextvars.ContextVar('strict_fetches', default=False)
+_page_flight = SingleFlight()
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+
+    for prefix in POOLED_HOSTS:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=False)
+        session.mount(prefix, adapter)
+
+    # Anything else still gets keep-alive, just with the default pool sizes.
+    return session
+
+
+class FetchFailed(Exception):
+    """Raised under strict_fetches() when a page failed to load rather than being missing."""
+
+
+@contextlib.contextmanager
+def strict_fetches():
+    """Within the block, fetch_page raises FetchFailed for an error status instead of returning None.
+
+    The crawler uses this so a page that failed isn't recorded as one with
+    no candidates. A missing page (404/410) still returns None.
+    """
+    token = _strict.set(True)
+    try:
+        yield
+    finally:
+        _strict.reset(token)
+
+
+def get_session():
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def upstream_url(url):
+    if not UPSTREAM_OVERRIDE:
+        return url
+    override = urlsplit(UPSTREAM_OVERRIDE)
+    return urlunsplit((override.scheme, override.netloc) + tuple(urlsplit(url))[2:])
+
+
+def fetch_page(url, stream=None):
+    """GET a page through the on-disk cache and the shared session.
+
+    Returns the HTML text, or None on a non-200. Only successful pages are
+    cached. Concurrent misses for the same URL share a single upstream request.
+    An expired copy is revalidated with a conditional GET rather than
+    downloaded again when the server supports it. If the host is down
+    (breaker open, retries exhausted) an expired cached copy is returned
+    when there is one; otherwise the error is raised.
+
+    stream, a streaming.SpecStream, downloads only as much of the page as
+    it needs and is left holding the parsed tree; only the text read is
+    cached and returned. That prefix is cached as a partial page, which
+    only other streamed fetches of the URL are served.
+    """
+    if not streaming.STREAMING_PARSE:
+        stream = None
+    partial = stream is not None
+    cached = page_cache.get(url, partial)
+    if cached is not None:
+        return cached
+    return _page_flight.do((url, partial), lambda: _fetch_and_store(url, stream))
+
+
+def _fetch_and_store(url, stream=None):
+    partial = stream is not None
+    # Another worker process may be fetching the same URL; whoever gets the
+    # lock second finds the page already in the shared cache.
+    with file_lock(url):
+        cached = page_cache.get(url, partial)
+        if cached is not None:
+            return cached
+
+        stored = page_cache.get_validators(url, partial)
+        try:
+            response = resilience.get(get_session(), url, upstream_url(url), TRANSIENT_ERRORS,
+                                      conditional_headers(stored), stream=partial)
+            text = None
+            if partial and response.status_code == 200:
+                with response:
+                    encoding = response.encoding or 'utf-8'
+                    body = streaming.read(stream, response.iter_content(streaming.STREAM_CHUNK), encoding)
+                    streaming.record(stream.page_type, stream.done, response.raw.tell(), content_length(response))
+                text = body.decode(encoding, errors='replace')
+            elif partial:
+                # Nothing to stream; give the connection back to the pool.
+                response.close()
+        except (resilience.CircuitOpen, QueueTimeout) + TRANSIENT_ERRORS as e:
+            stale = serve_stale(url, e, partial)
+            if stale is None:
+                raise
+            return stale
+        return store_response(url, stored, response, text, stream)
+
+
+def conditional_headers(stored):
+    """If-None-Match/If-Modified-Since for revalidating a stored page, from page_cache.get_validators."""
+    headers = {}
+    if stored is not None:
+        _, etag, last_modified, _ = stored
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def content_length(response):
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+
+def store_response(url, stored, response, text=None, stream=None):
+    """Turn an upstream response (requests or httpx) into the page text, updating the page cache.
+
+    text is the body when the caller already read it: a download through
+    stream, which is stored as a partial page if the stream stopped before
+    the end. A 304, or a 200 whose body hashes the same as the stored copy,
+    only restarts the stored page's freshness and returns the stored body.
+    """
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if response.status_code == 304 and stored is not None:
+        page_cache.touch(url, 'not_modified', etag, last_modified)
+        return stored[0]
+    if response.status_code in resilience.RETRY_STATUSES:
+        stale = serve_stale(url, f"status {response.status_code}", stream is not None)
+        if stale is not None:
+            return stale
+    if response.status_code != 200:
+        print(f"Failed to access {url} with status code {response.status_code}")
+        if _strict.get() and response.status_code not in MISSING_STATUSES:
+            raise FetchFailed(f"status code {response.status_code}")
+        return None
+
+    if text is None:
+        text = response.text
+    if stored is not None and stored[3] == page_cache.body_hash(text):
+        page_cache.touch(url, 'unchanged', etag, last_modified)
+        return stored[0]
+    page_cache.put(url, text, etag, last_modified, partial=stream is not None and stream.done)
+    return text
+
+
+def serve_stale(url, error, partial=False):
+    """The last cached copy of url, however old, for when fetching it failed; None if there is none.
+
+    partial allows a stored prefix, for a streamed fetch.
+    """
+    stale = page_cache.get_stale(url, partial)
+    if stale is None:
+        return None
+    resilience.breaker_for(url).count('fallbacks')
+    print(f"Serving cached copy of {url}: {error}")
+    return stale
+
+
+def get_fetch_stats():
+    return _page_flight.stats()
+
+
+def get_pool_stats():
+    """Per-host connection pool usage: requests served, connections opened and reuse hits."""
+    session = _session
+    if session is None:
+        return {}
+
+    stats = {}
+    for prefix, adapter in session.adapters.items():
+        if not isinstance(adapter, HTTPAdapter):
+            continue
+        for key, pool in list(adapter.poolmanager.pools._container.items()):
+            host = f"{key.key_scheme}://{key.key_host}"
+            if key.key_port:
+                host += f":{key.key_port}"
+            entry = stats.setdefault(host, {
+                'requests': 0,
+                'hits': 0,
+                'misses': 0,
+                'pool_maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+            })
+            # urllib3 counts every new socket in num_connections; everything else
+            # was served from an idle keep-alive connection.
+            entry['requests'] += pool.num_requests
+            entry['misses'] += pool.num_connections
+            entry['hits'] += max(pool.num_requests - pool.num_connections, 0)
+    return stats
@@ -1,5 +1,35 @@
-import requests
-from bs4 import BeautifulSoup
+from extraction import VOTEBOX_CANDIDATE_CELL, VOTEBOX_ROWS, VOTEBOX_TABLE, all_content, attr, compile_spec, content, contains_text, has_class, parse_tree
+from http_client import fetch_page
+from parsing import memoized_parse
+from result_cache import ELECTION_TTL, memoize
+
+FIRST_CANDIDATE_CELL = f"({VOTEBOX_CANDIDATE_CELL})[1]"
+
+# Every general-election votebox on the page, with all of its candidate rows.
+MUNICIPAL_SPEC = compile_spec({
+    'sections': f"//h5[{has_class('votebox-header-election-type')}][{contains_text('general election')}]",
+    'section_fields': {'election': content('.')},
+    'table': VOTEBOX_TABLE,
+    'rows': VOTEBOX_ROWS,
+    'row_fields': {
+        'name': content(f"{FIRST_CANDIDATE_CELL}//a"),
+        'link': attr(f"{FIRST_CANDIDATE_CELL}//a", 'href'),
+        'cell': content(FIRST_CANDIDATE_CELL),
+    },
+    'required': ['name', 'link', 'cell'],
+})
+
+# The county census widget: one labelled row per statistic, county value then state value.
+DEMOGRAPHICS_SPEC = compile_spec({
+    'sections': f"(//table[{has_class('census-table-widget')}])[1]",
+    'table': '.',
+    'rows': './/tr',
+    'row_fields': {
+        'label': content(f".//th[{has_class('census-table-census-item-header')}]"),
+        'cells': all_content(f".//td[{has_class('census-table-census-item')}]"),
+    },
+    'required': ['label'],
+})
 
 def get_full_party_name(party_abbreviation):
     """Map party abbreviation to full party name."""
@@ -12,45 +42,26 @@ def get_full_party_name(party_abbreviation):
     }
     return party_map.get(party_abbreviation, party_abbreviation)
 
-def scrape_municipal_candidates(county, state):
-    
-    url = f"https://ballotpedia.org/Municipal_elections_in_{county.replace(' ', '_')},_{state.replace(' ', '_')}_(2024)"
-    print(f"Accessing URL: {url}")  # Debug statement
-
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Failed to access {url} with status code {response.status_code}")
-        return {'candidates': [], 'demographics': []}
+def construct_municipal_url(county, state):
+    return f"https://ballotpedia.org/Municipal_elections_in_{county.replace(' ', '_')},_{state.replace(' ', '_')}_(2024)"
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+def parse_municipal_candidates(html):
+    tree = parse_tree(html)
 
     
     candidates = []
-    election_headers = soup.find_all('h5', class_='votebox-header-election-type')
-
-    for header in election_headers:
-        if 'general election' in header.text.lower():
-            election_name = header.text.strip()  
-            
-            candidates_table = header.find_next('table')
-            if candidates_table:
-                candidate_rows = candidates_table.find_all('tr', class_='results_row')
-                for row in candidate_rows:
-                    name_link = row.find('td', class_='votebox-results-cell--text').find('a')
-                    if name_link:
-                        name = name_link.text.strip()
-                        
-                        party_text = row.find('td', class_='votebox-results-cell--text').text.strip()
-                        party_symbol = party_text.split()[-1]  
-                        party_symbol = party_symbol.replace("(", "").replace(")", "").strip()  
-                        full_party_name = get_full_party_name(party_symbol)  
-                        
-                        candidates.append({
-                            'name': name,
-                            'party': full_party_name,  
-                            'link': name_link['href'],  
-                            'election': election_name  
-                        })
+    for section in MUNICIPAL_SPEC.extract(tree):
+        for row in section['rows']:
+            party_symbol = row['cell'].split()[-1]  
+            party_symbol = party_symbol.replace("(", "").replace(")", "").strip()  
+            full_party_name = get_full_party_name(party_symbol)  
+
+            candidates.append({
+                'name': row['name'],
+                'party': full_party_name,  
+                'link': row['link'],  
+                'election': section['election']  
+            })
 
     print("Candidates:")
     for candidate in candidates:
@@ -58,18 +69,13 @@ def scrape_municipal_candidates(county, state):
 
     
     demographics = []
-    demographics_table = soup.find('table', class_='census-table-widget')
-    if demographics_table:
-        rows = demographics_table.find_all('tr')
-        for row in rows:
-            header = row.find('th', class_='census-table-census-item-header')
-            if header:
-                label = header.text.strip()
-                cells = row.find_all('td', class_='census-table-census-item')
-                if len(cells) == 2:
-                    value_collin = cells[0].text.strip()
-                    value_texas = cells[1].text.strip()
-                    demographics.append({'label': label, 'value': f"{value_collin} (Collin County), {value_texas} (Texas)"})
+    for section in DEMOGRAPHICS_SPEC.extract(tree):
+        for row in section['rows']:
+            cells = row['cells']
+            if len(cells) == 2:
+                value_collin = cells[0]
+                value_texas = cells[1]
+                demographics.append({'label': row['label'], 'value': f"{value_collin} (Collin County), {value_texas} (Texas)"})
 
     
     print("\nDemographic Information:")
@@ -83,6 +89,17 @@ def scrape_municipal_candidates(county, state):
 
     return {'candidates': candidates, 'demographics': demographics}
 
+@memoize('municipal', ELECTION_TTL)
+def scrape_municipal_candidates(county, state):
+    url = construct_municipal_url(county, state)
+    print(f"Accessing URL: {url}")  # Debug statement
+
+    html = fetch_page(url)
+    if html is None:
+        return {'candidates': [], 'demographics': []}
+
+    return memoized_parse(parse_municipal_candidates, html)
+
 
 if __name__ == "__main__":
     county = "Collin County"
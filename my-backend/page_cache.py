@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from fingerprint import fingerprint
+
+# One SQLite file shared by every gunicorn worker on the box. WAL mode lets
+# readers in one worker proceed while another worker writes.
+PAGE_CACHE_PATH = os.environ.get(
+    'PAGE_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'civiccompass-page-cache.sqlite3'),
+)
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') != '0'
+
+# Every PRUNE_EVERY writes, pages not fetched or revalidated for
+# PAGE_CACHE_MAX_AGE seconds are deleted, then the least recently fetched
+# beyond PAGE_CACHE_MAX_ROWS. Old pages are only kept as a fallback for
+# when their source is down, and a month covers any outage worth riding out.
+PAGE_CACHE_MAX_AGE = int(os.environ.get('PAGE_CACHE_MAX_AGE', 30 * 24 * 3600))
+PAGE_CACHE_MAX_ROWS = int(os.environ.get('PAGE_CACHE_MAX_ROWS', 20000))
+PRUNE_EVERY = 500
+
+# Seconds a stored page counts as fresh, by host. Bios barely change; election
+# result pages are edited a few times a day.
+SOURCE_TTLS = {
+    'en.wikipedia.org': 7 * 24 * 3600,
+    'ballotpedia.org': 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'not_modified': 0, 'unchanged': 0, 'pruned': 0}
+
+# Columns added after the first release; older cache files get them on open.
+_VALIDATOR_COLUMNS = ('etag', 'last_modified', 'body_hash')
+
+
+def _connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(PAGE_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' url TEXT PRIMARY KEY,'
+            ' body TEXT NOT NULL,'
+            ' fetched_at REAL NOT NULL)'
+        )
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(pages)')}
+        for column in _VALIDATOR_COLUMNS:
+            if column not in columns:
+                conn.execute(f'ALTER TABLE pages ADD COLUMN {column} TEXT')
+        if 'partial' not in columns:
+            conn.execute('ALTER TABLE pages ADD COLUMN partial INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)')
+        _local.conn = conn
+    return conn
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def body_hash(body):
+    # Ignores per-render noise, so a refetch of the same revision counts as unchanged.
+    return fingerprint(body)
+
+
+def ttl_for(url):
+    host = urlsplit(url).hostname or ''
+    for source, ttl in SOURCE_TTLS.items():
+        if host == source or host.endswith('.' + source):
+            return ttl
+    return DEFAULT_TTL
+
+
+def get(url, partial=False):
+    """Return the cached body for url if it is still within its source TTL, else None.
+
+    A row holding only the start of the page (see put) counts only when
+    partial is true, i.e. for a streamed fetch that needs no more than that.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return None
+
+    row = _connect().execute(
+        'SELECT body, fetched_at FROM pages WHERE url = ? AND (partial = 0 OR ?)', (url, partial)
+    ).fetchone()
+    if row is None:
+        _count('misses')
+        return None
+
+    body, fetched_at = row
+    if time.time() - fetched_at > ttl_for(url):
+        _count('expired')
+        return None
+
+    _count('hits')
+    return body
+
+
+def get_stale(url, partial=False):
+    """Return the cached body for url however old it is, else None. For when the source is down."""
+    if not PAGE_CACHE_ENABLED:
+        return None
+    row = _connect().execute(
+        'SELECT body FROM pages WHERE url = ? AND (partial = 0 OR ?)', (url, partial)
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def get_validators(url, partial=False):
+    """(body, etag, last_modified, body_hash) for any stored copy of url, for revalidating it; None if there is none."""
+    if not PAGE_CACHE_ENABLED:
+        return None
+    return _connect().execute(
+        'SELECT body, etag, last_modified, body_hash FROM pages WHERE url = ? AND (partial = 0 OR ?)',
+        (url, partial),
+    ).fetchone()
+
+
+def put(url, body, etag=None, last_modified=None, partial=False):
+    """Store body as url's page. partial marks a body that is only the start of the page (a streamed download).
+
+    A partial row is kept without validators, since they describe the whole
+    page: it is never revalidated with a conditional GET, so a 304 can't
+    pass it off as complete.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return
+    if partial:
+        etag = last_modified = None
+    _connect().execute(
+        'INSERT OR REPLACE INTO pages (url, body, fetched_at, etag, last_modified, body_hash, partial)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (url, body, time.time(), etag, last_modified, body_hash(body), int(partial)),
+    )
+    with _stats_lock:
+        _stats['writes'] += 1
+        due = _stats['writes'] % PRUNE_EVERY == 0
+    if due:
+        prune()
+
+
+def prune():
+    """Delete pages older than PAGE_CACHE_MAX_AGE, then the oldest beyond PAGE_CACHE_MAX_ROWS. Returns how many went."""
+    if not PAGE_CACHE_ENABLED:
+        return 0
+    conn = _connect()
+    deleted = conn.execute('DELETE FROM pages WHERE fetched_at < ?', (time.time() - PAGE_CACHE_MAX_AGE,)).rowcount
+    deleted += conn.execute(
+        'DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)',
+        (PAGE_CACHE_MAX_ROWS,),
+    ).rowcount
+    with _stats_lock:
+        _stats['pruned'] += deleted
+    return deleted
+
+
+def touch(url, reason, etag=None, last_modified=None):
+    """Restart url's freshness without rewriting its body.
+
+    reason is 'not_modified' for a 304 or 'unchanged' for a 200 whose body
+    hashed the same as the stored one. New validators replace the old ones,
+    except on a partial row, which keeps none.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return
+    _connect().execute(
+        'UPDATE pages SET fetched_at = ?,'
+        ' etag = CASE WHEN partial THEN NULL ELSE COALESCE(?, etag) END,'
+        ' last_modified = CASE WHEN partial THEN NULL ELSE COALESCE(?, last_modified) END'
+        ' WHERE url = ?',
+        (time.time(), etag, last_modified, url),
+    )
+    _count(reason)
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['enabled'] = PAGE_CACHE_ENABLED
+    if PAGE_CACHE_ENABLED:
+        stats['entries'] = _connect().execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+    return stats
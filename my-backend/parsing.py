@@ -0,0 +1,49 @@
+import os
+
+from bs4 import BeautifulSoup
+
+from fingerprint import fingerprint
+from result_cache import LRUCache
+
+# lxml is several times faster than html.parser on the large Ballotpedia and
+# Wikipedia pages. Set SCRAPER_PARSER=html.parser to go back to the old tree.
+PARSER = os.environ.get('SCRAPER_PARSER', 'lxml')
+
+# With a SoupStrainer only the tags a scraper actually reads (and their
+# subtrees) are built; SCRAPER_STRAINER=0 builds the whole document.
+RESTRICT_TREE = os.environ.get('SCRAPER_STRAINER', '1') != '0'
+
+# Parsed output by page fingerprint, so a refetched page that hasn't changed
+# (a 304, or a 200 that differs only in volatile markup) isn't parsed again.
+PARSE_MEMO_MAX_ENTRIES = int(os.environ.get('PARSE_MEMO_MAX_ENTRIES', 1024))
+PARSE_MEMO_MAX_BYTES = int(os.environ.get('PARSE_MEMO_MAX_BYTES', 32 * 1024 * 1024))
+PARSE_MEMO_TTL = 30 * 24 * 3600
+
+_parse_memo = LRUCache(PARSE_MEMO_MAX_ENTRIES, PARSE_MEMO_MAX_BYTES)
+
+
+def make_soup(html, parse_only=None):
+    """Build a BeautifulSoup tree with the configured parser, restricted to parse_only when enabled."""
+    if not RESTRICT_TREE:
+        parse_only = None
+    return BeautifulSoup(html, PARSER, parse_only=parse_only)
+
+
+def memoized_parse(parse, html, *args, tree=None):
+    """parse(html, *args), reusing the result of any earlier parse of a page with the same fingerprint.
+
+    tree is an lxml tree already built from html (by a streamed download);
+    it is handed to parse instead of the text, for parsers that go through
+    extraction.parse_tree.
+    """
+    key = (parse.__name__, fingerprint(html)) + args
+    entry = _parse_memo.get(key)
+    if entry is not None:
+        return entry['value']
+    value = parse(tree if tree is not None else html, *args)
+    _parse_memo.set(key, value, PARSE_MEMO_TTL)
+    return value
+
+
+def get_parse_memo_stats():
+    return _parse_memo.stats()
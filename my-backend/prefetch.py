@@ -0,0 +1,129 @@
+"""Warm caches for lookups a user is about to make.
+
+After /api/elections or /api/municipal_candidates returns candidates, the
+next requests are usually bio clicks on those same names. With
+BIO_PREFETCH=1 the endpoints hand the names to a small queue here, and a
+couple of background threads fetch the bios at BACKGROUND priority, so any
+live request to Wikipedia goes ahead of them.
+
+Likewise, once /api/representatives has resolved an address to a state,
+district and county, the page that asked goes on to request the elections
+and municipal results for them. With SCRAPE_PREFETCH=1 (the default) those
+scrapes are queued as soon as the divisions are known. A request that
+arrives while one is still running waits on it rather than starting its own,
+and promotes it to the request's own priority (see rate_limit.promote).
+
+The queues are bounded. When one is full new work is dropped, not queued.
+Lookups already cached or already queued are skipped.
+"""
+import os
+import queue
+import threading
+
+from house_scraper import scrape_house_candidates
+from municipal_scraper import scrape_municipal_candidates
+from rate_limit import BACKGROUND, priority
+from senate_scraper import scrape_senate_candidates, scrape_voter_info
+from wiki import get_wikipedia_bio
+
+BIO_PREFETCH = os.environ.get('BIO_PREFETCH', '0') == '1'
+PREFETCH_QUEUE_SIZE = int(os.environ.get('BIO_PREFETCH_QUEUE_SIZE', 256))
+PREFETCH_WORKERS = int(os.environ.get('BIO_PREFETCH_WORKERS', 2))
+
+SCRAPE_PREFETCH = os.environ.get('SCRAPE_PREFETCH', '1') == '1'
+SCRAPE_PREFETCH_QUEUE_SIZE = int(os.environ.get('SCRAPE_PREFETCH_QUEUE_SIZE', 64))
+SCRAPE_PREFETCH_WORKERS = int(os.environ.get('SCRAPE_PREFETCH_WORKERS', 4))
+
+
+class Prefetcher:
+    """Run memoized fn(*args) calls in the background for keys not already cached, queued or running."""
+
+    def __init__(self, name, enabled, workers, max_queue):
+        self.name = name
+        self.enabled = enabled
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._threads = []
+        self._stats = {'queued': 0, 'already_cached': 0, 'already_queued': 0, 'dropped': 0,
+                       'fetched': 0, 'failed': 0}
+
+    def _start(self):
+        # Threads are started on first use so importing this module (e.g.
+        # in the crawler) doesn't leave idle threads behind.
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'prefetch-{self.name}-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args):
+        key = fn.key(*args)
+        if fn.cached(*args):
+            self._count('already_cached')
+            return
+        with self._lock:
+            if key in self._pending:
+                self._stats['already_queued'] += 1
+                return
+            try:
+                self._queue.put_nowait((key, fn, args))
+            except queue.Full:
+                self._stats['dropped'] += 1
+                return
+            self._pending.add(key)
+            self._stats['queued'] += 1
+            self._start()
+
+    def _work(self):
+        while True:
+            key, fn, args = self._queue.get()
+            try:
+                with priority(BACKGROUND):
+                    if not fn.cached(*args):
+                        fn.lookup(*args)
+                self._count('fetched')
+            except Exception as e:
+                self._count('failed')
+                print(f"Prefetch failed for {args}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, enabled=self.enabled, queue_depth=self._queue.qsize(),
+                        max_queue=self._queue.maxsize, workers=len(self._threads))
+
+
+_bios = Prefetcher('bios', BIO_PREFETCH, PREFETCH_WORKERS, PREFETCH_QUEUE_SIZE)
+_scrapes = Prefetcher('scrapes', SCRAPE_PREFETCH, SCRAPE_PREFETCH_WORKERS, SCRAPE_PREFETCH_QUEUE_SIZE)
+
+
+def prefetch_bios(candidates, role):
+    """Queue bios for a list of scraped candidates ({'name': ...} dicts), if prefetching is on."""
+    if not BIO_PREFETCH:
+        return
+    for candidate in candidates:
+        if candidate.get('name'):
+            _bios.submit(get_wikipedia_bio, candidate['name'], role)
+
+
+def prefetch_scrapes(state, district=None, county=None):
+    """Queue the election scrapes for a state, and its House district and county when known, if prefetching is on."""
+    if not SCRAPE_PREFETCH or not state:
+        return
+    if district:
+        _scrapes.submit(scrape_house_candidates, state, district)
+    _scrapes.submit(scrape_senate_candidates, state)
+    _scrapes.submit(scrape_voter_info, state)
+    if county:
+        _scrapes.submit(scrape_municipal_candidates, county, state)
+
+
+def get_stats():
+    return {'bios': _bios.stats(), 'scrapes': _scrapes.stats()}
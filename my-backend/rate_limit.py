@@ -0,0 +1,498 @@
+"""Per-host rate and concurrency limits for upstream fetches.
+
+Every fetch takes a slot from its host's limiter first. A slot needs a token
+from the host's bucket (requests per second) and a free place under the
+host's concurrency limit. Both adapt AIMD-style: each healthy response
+raises them a little, and a 429, a 5xx, a connection error or a response
+slower than SLOW_RESPONSE_SECONDS halves them. Backoffs are at most one per
+BACKOFF_COOLDOWN, so a burst of failures from requests that were already
+in flight only counts once.
+
+Waiting callers are served by priority, then arrival. Interactive API
+traffic is the default. The crawler, prefetches and background cache
+refreshes run under ``with priority(BACKGROUND):``, so a user's request
+overtakes them in the queue. When a user's request ends up waiting on
+background work instead (it joined a prefetch's single flight), promote()
+moves that work up to the user's priority, including fetches it already
+has queued.
+
+Request tokens come from one bucket per host shared by every process on
+the box (the gunicorn workers and crawl.py), kept in a small SQLite file
+(RATE_LIMIT_PATH, in the temp directory by default), so together they stay
+within the host's rate. A Retry-After pause is shared the same way. The
+file is only touched outside the limiter's lock, and never on an event
+loop. Each process still adapts its
+own rate and concurrency and queues its own callers. With
+SHARED_RATE_LIMIT=0 the buckets are per process and every worker gets the
+whole configured rate.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+# Starting (and highest) requests per second per host.
+HOST_RATES = {
+    'ballotpedia.org': float(os.environ.get('BALLOTPEDIA_RATE', 5)),
+    'en.wikipedia.org': float(os.environ.get('WIKIPEDIA_RATE', 10)),
+    'www.googleapis.com': float(os.environ.get('CIVIC_RATE', 10)),
+}
+DEFAULT_RATE = float(os.environ.get('UPSTREAM_RATE', 5))
+MIN_RATE = 0.2
+
+MAX_CONCURRENCY = int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', 8))
+MIN_CONCURRENCY = 1
+
+SLOW_RESPONSE_SECONDS = float(os.environ.get('UPSTREAM_SLOW_SECONDS', 5))
+BACKOFF_COOLDOWN = 2.0
+
+# How long a caller may wait for a slot before giving up.
+QUEUE_TIMEOUT = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT', 30))
+
+SHARED_RATE_LIMIT = os.environ.get('SHARED_RATE_LIMIT', '1') != '0'
+RATE_LIMIT_PATH = os.environ.get(
+    'RATE_LIMIT_PATH',
+    os.path.join(tempfile.gettempdir(), 'civiccompass-rate-limit.sqlite3'),
+)
+
+_priority = contextvars.ContextVar('upstream_priority', default=None)
+
+
+class _Level:
+    """The priority of one ``with priority():`` block; promote() may raise it while the block runs."""
+
+    def __init__(self, level):
+        self.level = level
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Run the block's upstream fetches at the given priority."""
+    token = _priority.set(_Level(level))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    context = _priority.get()
+    return INTERACTIVE if context is None else context.level
+
+
+def priority_context():
+    """A handle on the current block's priority, for promote() to raise from another thread."""
+    return _priority.get()
+
+
+def promote(context, level=INTERACTIVE):
+    """Raise the priority of the block behind context to level, including its fetches already queued."""
+    if context is None or context.level <= level:
+        return
+    context.level = level
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        limiter.reprioritize(context)
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+class _Waiter:
+    """A queued caller, woken through a thread event or an asyncio future."""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.priority = priority_context()
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Slot:
+    """One granted request; report how it went with record()."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        self.status = None
+        self.retry_after = None
+
+    def record(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SharedBuckets:
+    """Token buckets in a SQLite file, so every process on the box draws on the same per-host budget.
+
+    Times are wall-clock, as monotonic clocks aren't comparable between
+    processes. Each process refills at its own current rate.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                ' host TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' refilled_at REAL NOT NULL,'
+                ' paused_until REAL NOT NULL DEFAULT 0)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, host, rate):
+        """Take a token for host. Returns 0 if one was taken, else seconds until one is due."""
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock up front, so no other
+            # process can spend the same token between the read and write.
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT tokens, refilled_at, paused_until FROM buckets WHERE host = ?', (host,)
+            ).fetchone()
+            tokens, refilled_at, paused_until = row if row is not None else (1.0, now, 0.0)
+            if now < paused_until:
+                return paused_until - now
+            tokens = min(max(1.0, rate), tokens + max(0.0, now - refilled_at) * rate)
+            wait = 0.0
+            if tokens < 1:
+                wait = (1 - tokens) / rate
+            else:
+                tokens -= 1
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (host, tokens, refilled_at, paused_until) VALUES (?, ?, ?, ?)',
+                (host, tokens, now, paused_until),
+            )
+            return wait
+
+    def pause(self, host, seconds):
+        """Hold back every process's requests to host for seconds (a Retry-After)."""
+        until = time.time() + seconds
+        self._connect().execute(
+            'INSERT INTO buckets (host, tokens, refilled_at, paused_until) VALUES (?, 0, ?, ?)'
+            ' ON CONFLICT(host) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)',
+            (host, time.time(), until),
+        )
+
+
+_shared = SharedBuckets(RATE_LIMIT_PATH) if SHARED_RATE_LIMIT else None
+
+
+class HostLimiter:
+    def __init__(self, host, rate, max_concurrency=MAX_CONCURRENCY):
+        self.host = host
+        self.max_rate = rate
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.tokens = 1.0
+        self.in_flight = 0
+
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatching = False
+        self._spare_token = False
+        self._wakeup = None
+        self._wakeup_at = 0.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        self._stats = {'granted': 0, 'backoffs': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'shared_errors': 0}
+
+    def _refill(self, now):
+        burst = max(1.0, self.rate)
+        self.tokens = min(burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _blocked(self):
+        """None if the front waiter may have a slot once it has a token; else 0 (nothing to do) or seconds paused."""
+        if not self._waiters or self.in_flight >= int(self.concurrency):
+            return 0
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        return None
+
+    def _grant_next(self):
+        _, _, waiter = heapq.heappop(self._waiters)
+        self.in_flight += 1
+        self._stats['granted'] += 1
+        waiter.grant()
+
+    def _dispatch(self):
+        """Grant slots to the front of the queue while tokens and concurrency allow.
+
+        Called without self._lock held, since taking a shared token is a
+        SQLite transaction. One thread per limiter dispatches at a time;
+        the others leave their waiters to it. When the next token isn't due
+        yet, a timer dispatches again then.
+        """
+        with self._lock:
+            if self._dispatching:
+                return
+            self._dispatching = True
+        while True:
+            with self._lock:
+                blocked = self._blocked()
+                if blocked is None and self._spare_token:
+                    self._spare_token = False
+                    self._grant_next()
+                    continue
+                if blocked is not None:
+                    self._dispatching = False
+                    if blocked > 0:
+                        self._wake_in(blocked)
+                    return
+            try:
+                wait = self._take_shared_token()
+            except BaseException:
+                with self._lock:
+                    self._dispatching = False
+                raise
+            with self._lock:
+                if wait is None:
+                    wait = self._take_local_token(time.monotonic())
+                if wait > 0:
+                    self._dispatching = False
+                    self._wake_in(wait)
+                    return
+                if self._blocked() is None:
+                    self._grant_next()
+                else:
+                    # The waiter gave up meanwhile; keep the token for the next one.
+                    self._spare_token = True
+
+    def _wake_in(self, seconds):
+        """Dispatch again in seconds, unless a wakeup is already due by then. Called with self._lock held."""
+        due = time.monotonic() + seconds
+        if self._wakeup is not None and self._wakeup_at <= due:
+            return
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = threading.Timer(seconds, self._wake)
+        self._wakeup.daemon = True
+        self._wakeup_at = due
+        self._wakeup.start()
+
+    def _wake(self):
+        with self._lock:
+            self._wakeup = None
+        self._dispatch()
+
+    def _take_shared_token(self):
+        """A token from the shared bucket: 0 if taken, seconds until one is due, or None to use the local bucket."""
+        if _shared is None:
+            return None
+        try:
+            return _shared.take(self.host, self.rate)
+        except sqlite3.Error as e:
+            # Locked or unwritable; this process's own bucket will do.
+            with self._lock:
+                self._stats['shared_errors'] += 1
+            print(f"Shared rate limit unavailable for {self.host}: {e}")
+            return None
+
+    def _take_local_token(self, now):
+        self._refill(now)
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        return 0
+
+    def _enqueue(self, waiter):
+        heapq.heappush(self._waiters, (current_priority(), next(self._sequence), waiter))
+
+    def reprioritize(self, context):
+        """Re-sort the queue after promote() raised context's level."""
+        with self._lock:
+            if not any(waiter.priority is context for _, _, waiter in self._waiters):
+                return
+            self._waiters = [(context.level if waiter.priority is context else level, sequence, waiter)
+                             for level, sequence, waiter in self._waiters]
+            heapq.heapify(self._waiters)
+
+    def _abandon(self, waiter):
+        """Take a waiter that gave up out of the queue. Returns False if it got a slot meanwhile, which it still holds."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+            heapq.heapify(self._waiters)
+            self._stats['timeouts'] += 1
+            return True
+
+    def _queue_timeout(self, timeout):
+        return QueueTimeout(f"Gave up waiting {timeout:g}s for a request slot to {self.host}")
+
+    def acquire(self, timeout=QUEUE_TIMEOUT):
+        waiter = _Waiter()
+        queued_at = time.monotonic()
+        with self._lock:
+            self._enqueue(waiter)
+        self._dispatch()
+        if not waiter.event.wait(timeout) and self._abandon(waiter):
+            raise self._queue_timeout(timeout)
+        with self._lock:
+            self._stats['wait_seconds'] += time.monotonic() - queued_at
+        return Slot(self)
+
+    async def acquire_async(self, timeout=QUEUE_TIMEOUT):
+        waiter = _Waiter(asyncio.get_running_loop())
+        queued_at = time.monotonic()
+        with self._lock:
+            self._enqueue(waiter)
+        try:
+            await asyncio.to_thread(self._dispatch)
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, queued_at + timeout - time.monotonic()))
+        except BaseException as e:
+            # Timed out or cancelled while queued. A slot granted meanwhile
+            # is handed back and passed on from a timer thread, off the loop.
+            if not self._abandon(waiter):
+                with self._lock:
+                    self.in_flight -= 1
+                    self._wake_in(0)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._queue_timeout(timeout) from None
+            raise
+        with self._lock:
+            self._stats['wait_seconds'] += time.monotonic() - queued_at
+        return Slot(self)
+
+    def release(self, slot):
+        elapsed = time.monotonic() - slot.started
+        with self._lock:
+            pause = self._release(slot.status, elapsed, slot.retry_after)
+        if pause and _shared is not None:
+            try:
+                _shared.pause(self.host, pause)
+            except sqlite3.Error as e:
+                print(f"Shared rate limit unavailable for {self.host}: {e}")
+        self._dispatch()
+
+    def _release(self, status, elapsed=0.0, retry_after=None):
+        """Adjust the limits for a finished request. Returns the Retry-After pause to share, if any."""
+        self.in_flight -= 1
+        now = time.monotonic()
+        if status is None or status == 429 or status >= 500 or elapsed > SLOW_RESPONSE_SECONDS:
+            if now - self._last_backoff >= BACKOFF_COOLDOWN:
+                self._last_backoff = now
+                self._stats['backoffs'] += 1
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+                self.rate = max(MIN_RATE, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+                return retry_after
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+        return None
+
+    def stats(self):
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for level, _, _ in self._waiters:
+                queued[PRIORITY_NAMES.get(level, str(level))] += 1
+            return dict(
+                self._stats,
+                wait_seconds=round(self._stats['wait_seconds'], 3),
+                rate=round(self.rate, 2),
+                max_rate=self.max_rate,
+                concurrency_limit=int(self.concurrency),
+                max_concurrency=self.max_concurrency,
+                in_flight=self.in_flight,
+                queued=queued,
+                paused_for=round(max(0.0, self._paused_until - time.monotonic()), 1),
+                shared=_shared is not None,
+            )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(url):
+    host = urlsplit(url).netloc
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = HostLimiter(host, HOST_RATES.get(host, DEFAULT_RATE))
+                _limiters[host] = limiter
+    return limiter
+
+
+@contextlib.contextmanager
+def slot(url):
+    """Hold a request slot for url's host; record the response status on the yielded Slot.
+
+    A block that raises without recording a status counts as a failure.
+    """
+    limiter = limiter_for(url)
+    granted = limiter.acquire()
+    try:
+        yield granted
+    finally:
+        limiter.release(granted)
+
+
+@contextlib.asynccontextmanager
+async def slot_async(url):
+    limiter = limiter_for(url)
+    granted = await limiter.acquire_async()
+    try:
+        yield granted
+    finally:
+        # release() may take a shared token for the next waiter.
+        await asyncio.to_thread(limiter.release, granted)
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header given in seconds; HTTP dates are ignored."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.stats() for limiter in limiters}
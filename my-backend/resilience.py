@@ -0,0 +1,227 @@
+"""Timeouts, retries and per-host circuit breakers for upstream GETs.
+
+Each attempt runs under connect/read timeouts and takes a slot from the
+host's rate limiter. Connection errors, timeouts, 429s and 5xx responses
+are retried up to MAX_RETRIES times with exponential backoff and full
+jitter, waiting at least as long as a Retry-After header asks. Only GETs
+come through here, so retrying is always safe.
+
+A host that fails FAILURE_THRESHOLD attempts in a row opens its breaker.
+While the breaker is open, calls fail at once with CircuitOpen instead of
+piling up behind a dead host. After RESET_TIMEOUT seconds one probe
+request is let through. If it succeeds the breaker closes; if it fails the
+breaker opens again. Callers that hold an older copy of the data (see
+http_client.fetch_page) serve it instead of failing.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import rate_limit
+
+CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10))
+
+MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', 2))
+BACKOFF_BASE = float(os.environ.get('UPSTREAM_BACKOFF_BASE', 0.5))
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Query parameters whose values never reach the logs: Civic lookups carry
+# the user's address.
+REDACTED_PARAMS = {'address', 'key'}
+
+FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, host, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'attempts': 0, 'retries': 0, 'failures': 0, 'gave_up': 0,
+                       'rejected': 0, 'opened': 0, 'fallbacks': 0}
+
+    def before_request(self):
+        """Raise CircuitOpen unless a request to this host may go out now."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+                self._stats['rejected'] += 1
+                raise CircuitOpen(f"{self.host} is failing; not sending requests to it for now")
+            if self.state == HALF_OPEN:
+                self._probing = True
+            self._stats['attempts'] += 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"Circuit for {self.host} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._stats['failures'] += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._stats['opened'] += 1
+                    print(f"Circuit for {self.host} opened after {self.failures} failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def cancel_attempt(self):
+        """An attempt ended without saying anything about the host (e.g. it never got a rate-limit slot)."""
+        with self._lock:
+            self._probing = False
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, state=self.state, consecutive_failures=self.failures)
+            if self.state == OPEN:
+                stats['retry_in'] = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+            return stats
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url):
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def loggable(url):
+    """url with the values of REDACTED_PARAMS masked, for printing."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(name, 'REDACTED' if name in REDACTED_PARAMS else value)
+             for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, but never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, min(retry_after, BACKOFF_CAP))
+    return delay
+
+
+def _retry_after(response):
+    return rate_limit.parse_retry_after(response.headers.get('Retry-After'))
+
+
+def _give_up_or_wait(breaker, url, attempt, reason, retry_after=None):
+    """Returns the backoff before the next attempt, or None when the retries are used up."""
+    if attempt >= MAX_RETRIES:
+        breaker.count('gave_up')
+        return None
+    breaker.count('retries')
+    delay = backoff_delay(attempt, retry_after)
+    print(f"Retrying {loggable(url)} in {delay:.1f}s after {reason}")
+    return delay
+
+
+def get(session, url, fetch_url=None, transient_errors=(), headers=None, stream=False):
+    """GET url with timeouts, retries and the host's breaker and rate limiter.
+
+    Returns the last response, which may be an error status once retries run
+    out. Raises CircuitOpen, rate_limit.QueueTimeout, or the last transient
+    error. fetch_url is where the request actually goes; limits and breakers
+    are still keyed by url's host. With stream=True the body of the returned
+    response is left unread for the caller to read and close.
+    """
+    breaker = breaker_for(url)
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.before_request()
+        try:
+            with rate_limit.slot(url) as slot:
+                response = session.get(fetch_url or url, headers=headers, stream=stream,
+                                       timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                slot.record(response.status_code, _retry_after(response))
+        except transient_errors as e:
+            breaker.record_failure()
+            delay = _give_up_or_wait(breaker, url, attempt, type(e).__name__)
+            if delay is None:
+                raise
+        except BaseException:
+            breaker.cancel_attempt()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            delay = _give_up_or_wait(breaker, url, attempt, f"status {response.status_code}", _retry_after(response))
+            if delay is None:
+                return response
+            response.close()
+        time.sleep(delay)
+
+
+async def get_async(client, url, fetch_url=None, transient_errors=(), headers=None, stream=False):
+    """Coroutine version of get() for an httpx.AsyncClient, which carries its own timeouts."""
+    breaker = breaker_for(url)
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.before_request()
+        try:
+            async with rate_limit.slot_async(url) as slot:
+                request = client.build_request('GET', fetch_url or url, headers=headers)
+                response = await client.send(request, stream=stream)
+                slot.record(response.status_code, _retry_after(response))
+        except transient_errors as e:
+            breaker.record_failure()
+            delay = _give_up_or_wait(breaker, url, attempt, type(e).__name__)
+            if delay is None:
+                raise
+        except BaseException:
+            breaker.cancel_attempt()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            delay = _give_up_or_wait(breaker, url, attempt, f"status {response.status_code}", _retry_after(response))
+            if delay is None:
+                return response
+            await response.aclose()
+        await asyncio.sleep(delay)
+
+
+def get_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.host: breaker.stats() for breaker in breakers}
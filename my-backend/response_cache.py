@@ -0,0 +1,153 @@
+"""Serialized API responses, kept with ready-made gzip and brotli encodings.
+
+A cacheable response (one with an ETag, see http_cache) is serialized and
+compressed once. Until its ETag changes, the same request is answered with
+the stored bytes in the best encoding its Accept-Encoding allows, so a
+repeat spends no CPU on JSON or compression. Bodies under MIN_COMPRESS_BYTES
+are stored and served uncompressed.
+
+Stats are kept per route: hits and misses, which encodings were served,
+and the compression ratio (compressed / original bytes) of what was stored.
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # gzip only.
+    brotli = None
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 9
+# Quality 11 takes ~40x as long as 9 on a 200 KB municipal payload for no
+# smaller output, and a miss pays for it inline.
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 9))
+
+# Preferred first when the client accepts several equally.
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(body):
+    """{encoding: bytes} for a serialized body, including 'identity'."""
+    encodings = {'identity': body}
+    if len(body) < MIN_COMPRESS_BYTES:
+        return encodings
+    # mtime=0 keeps the gzip bytes the same for the same body.
+    encodings['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return encodings
+
+
+def choose_encoding(encodings, accept_encodings):
+    """The stored encoding to send for a request's werkzeug accept_encodings."""
+    best = 'identity'
+    best_quality = 0
+    for encoding in ENCODINGS:
+        quality = accept_encodings[encoding]
+        if encoding in encodings and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ResponseCache:
+    """LRU of {encoding: bytes} bounded by entry count and total bytes, with per-route stats."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._evictions = 0
+        self._routes = {}
+
+    def _route_stats(self, route):
+        return self._routes.setdefault(route, {
+            'hits': 0, 'misses': 0, 'served': {},
+            'identity_bytes': 0, 'gzip_bytes': 0, 'br_bytes': 0,
+        })
+
+    def get(self, route, key):
+        with self._lock:
+            encodings = self._data.get(key)
+            if encodings is None:
+                self._route_stats(route)['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._route_stats(route)['hits'] += 1
+            return encodings
+
+    def put(self, route, key, encodings):
+        size = sum(len(body) for body in encodings.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= sum(len(body) for body in old.values())
+            self._data[key] = encodings
+            self._bytes += size
+
+            stats = self._route_stats(route)
+            if 'gzip' in encodings:
+                # Ratios only cover bodies that were big enough to compress.
+                stats['identity_bytes'] += len(encodings['identity'])
+                stats['gzip_bytes'] += len(encodings['gzip'])
+                stats['br_bytes'] += len(encodings.get('br', b''))
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= sum(len(body) for body in evicted.values())
+                self._evictions += 1
+
+    def served(self, route, encoding):
+        with self._lock:
+            served = self._route_stats(route)['served']
+            served[encoding] = served.get(encoding, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for route, counts in self._routes.items():
+                original = counts['identity_bytes']
+                routes[route] = dict(
+                    counts,
+                    served=dict(counts['served']),
+                    gzip_ratio=round(counts['gzip_bytes'] / original, 3) if original else None,
+                    br_ratio=round(counts['br_bytes'] / original, 3) if original and brotli is not None else None,
+                )
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions,
+                'encodings': ENCODINGS,
+                'routes': routes,
+            }
+
+
+_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+
+def encoded_body(route, key, accept_encodings, serialize):
+    """(encoding, bytes) of a cacheable response, serializing and compressing it only on a miss.
+
+    key must change whenever the body would; serialize() returns the JSON bytes.
+    """
+    encodings = _cache.get(route, key)
+    if encodings is None:
+        encodings = compress(serialize())
+        _cache.put(route, key, encodings)
+    encoding = choose_encoding(encodings, accept_encodings)
+    _cache.served(route, encoding)
+    return encoding, encodings[encoding]
+
+
+def get_stats():
+    return _cache.stats()
@@ -0,0 +1,251 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import BACKGROUND, priority
+from singleflight import SingleFlight
+
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 4096))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+REFRESH_WORKERS = int(os.environ.get('RESULT_CACHE_REFRESH_WORKERS', 4))
+
+ELECTION_TTL = 6 * 3600
+BIO_TTL = 7 * 24 * 3600
+CIVIC_TTL = 24 * 3600
+
+# Empty results usually mean the page was missing or failed to load, so they
+# are only kept long enough to absorb a burst of identical requests.
+EMPTY_TTL = 300
+
+# After a background refresh fails or comes back empty, the stale value is
+# served this long before another refresh is tried.
+REFRESH_RETRY_SECONDS = 60
+
+# etag identifies the value's content (see value_etag); None when unknown.
+CachedResult = namedtuple('CachedResult', ['value', 'age', 'stale', 'etag'], defaults=(None,))
+
+
+def normalize_key(args):
+    """Fold case, underscores and runs of whitespace so 'New_York' == ' new york '."""
+    return tuple(re.sub(r'[\s_]+', ' ', str(arg)).strip().lower() for arg in args)
+
+
+def _serialize(value):
+    try:
+        return json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def value_etag(value, serialized=None):
+    """Short content hash of a cached value; equal values get equal tags."""
+    if serialized is None:
+        serialized = _serialize(value)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()[:16]
+
+
+def _is_empty(value):
+    if isinstance(value, dict):
+        return not any(value.values())
+    return not value
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by both entry count and approximate payload bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {}
+        self._evictions = 0
+
+    def _namespace_stats(self, namespace):
+        return self._stats.setdefault(namespace, {'hits': 0, 'stale_hits': 0, 'misses': 0})
+
+    def get(self, key):
+        """Return the stored entry, expired or not, counting a hit, stale hit or miss."""
+        namespace = key[0]
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._namespace_stats(namespace)['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            if time.time() - entry['stored_at'] > entry['ttl']:
+                self._namespace_stats(namespace)['stale_hits'] += 1
+            else:
+                self._namespace_stats(namespace)['hits'] += 1
+            return entry
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._data
+
+    def set(self, key, value, ttl):
+        serialized = _serialize(value)
+        size = len(serialized)
+        if size > self.max_bytes:
+            return
+        etag = value_etag(value, serialized)
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old['size']
+
+            self._data[key] = {'value': value, 'size': size, 'etag': etag, 'stored_at': time.time(), 'ttl': ttl}
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted['size']
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            namespaces = {}
+            for namespace, counts in self._stats.items():
+                served = counts['hits'] + counts['stale_hits']
+                lookups = served + counts['misses']
+                namespaces[namespace] = dict(counts, hit_ratio=round(served / lookups, 3) if lookups else 0.0)
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions,
+                'namespaces': namespaces,
+            }
+
+
+_cache = LRUCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES)
+_flight = SingleFlight()
+
+_refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='refresh')
+_refresh_lock = threading.Lock()
+_refreshing = set()
+_refresh_stats = {'scheduled': 0, 'failed': 0}
+
+
+def _schedule_refresh(key, revalidate, label):
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        _refresh_stats['scheduled'] += 1
+
+    def run():
+        try:
+            with priority(BACKGROUND):
+                _flight.do(key, revalidate)
+        except Exception as e:
+            with _refresh_lock:
+                _refresh_stats['failed'] += 1
+            print(f"Background refresh failed for {label}: {str(e)}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    _refresh_executor.submit(run)
+
+
+def memoize(namespace, ttl, key_args=None, private=False):
+    """Cache a scraper's parsed output in-process, keyed by its normalized arguments.
+
+    A hit returns the stored result without fetching or parsing anything.
+    Concurrent misses for the same key wait on one call and share its result.
+    Expired entries are served stale while a single background refresh runs;
+    only a key that was never cached makes the caller wait. A refresh that
+    fails or comes back empty is retried after REFRESH_RETRY_SECONDS.
+
+    The decorated function returns the plain value; ``fn.lookup(*args)``
+    returns a CachedResult with the value's age, stale flag and etag,
+    ``fn.prime(args, value)`` stores a value computed elsewhere,
+    ``fn.cached(*args)`` says whether anything (fresh or stale) is stored,
+    and ``fn.key(*args)`` is the cache key the arguments map to.
+
+    key_args maps the call's arguments to the ones that identify the result,
+    for functions that take arguments they ignore. private keeps the
+    arguments (e.g. a user's address) out of the logs.
+    """
+    def decorator(fn):
+        def key_for(args):
+            return (namespace,) + normalize_key(key_args(*args) if key_args else args)
+
+        def store(key, value):
+            _cache.set(key, value, EMPTY_TTL if _is_empty(value) else ttl)
+
+        def compute_for(key, args):
+            def compute():
+                value = fn(*args)
+                store(key, value)
+                return value
+            return compute
+
+        def lookup(*args):
+            key = key_for(args)
+            compute = compute_for(key, args)
+
+            entry = _cache.get(key)
+            if entry is None:
+                value = _flight.do(key, compute)
+                return CachedResult(value, 0, False, value_etag(value))
+
+            age = time.time() - entry['stored_at']
+            if age <= entry['ttl']:
+                return CachedResult(entry['value'], age, False, entry['etag'])
+
+            def revalidate():
+                try:
+                    value = fn(*args)
+                except Exception:
+                    entry['retry_at'] = time.time() + REFRESH_RETRY_SECONDS
+                    raise
+                # A failed refetch comes back empty; keep serving the old data.
+                if _is_empty(value) and not _is_empty(entry['value']):
+                    entry['retry_at'] = time.time() + REFRESH_RETRY_SECONDS
+                    return entry['value']
+                store(key, value)
+                return value
+
+            if time.time() >= entry.get('retry_at', 0):
+                _schedule_refresh(key, revalidate, namespace if private else key)
+            return CachedResult(entry['value'], age, True, entry['etag'])
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            return lookup(*args).value
+
+        def prime(args, value):
+            store(key_for(args), value)
+
+        def cached(*args):
+            return _cache.contains(key_for(args))
+
+        wrapper.lookup = lookup
+        wrapper.prime = prime
+        wrapper.cached = cached
+        wrapper.key = lambda *args: key_for(args)
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def get_stats():
+    with _refresh_lock:
+        refresh = dict(_refresh_stats, in_progress=len(_refreshing))
+    return dict(_cache.stats(), single_flight=_flight.stats(), background_refresh=refresh)
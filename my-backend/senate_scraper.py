@@ -1,81 +1,93 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 
+from extraction import VOTEBOX_CANDIDATE_FIELDS, VOTEBOX_ROWS, VOTEBOX_TABLE, compile_spec, contains_text, has_class, parse_tree
+from http_client import fetch_page
+from parsing import make_soup, memoized_parse
+from result_cache import ELECTION_TTL, memoize
+from streaming import SpecStream
 
-def scrape_voter_info(state_name):
-    
+VOTER_INFO_TAGS = SoupStrainer('div', class_='vis_widget_row')
+
+# First general-election votebox header, then the first 2 candidates in the table after it.
+SENATE_SPEC = compile_spec({
+    'sections': f"//h5[{has_class('votebox-header-election-type')}][{contains_text('general election')}]",
+    'first_section_only': True,
+    'table': VOTEBOX_TABLE,
+    'rows': VOTEBOX_ROWS,
+    'row_limit': 2,
+    'row_fields': VOTEBOX_CANDIDATE_FIELDS,
+    'required': ['name', 'href', 'party'],
+})
+
+
+def construct_voter_info_url(state_name):
     state_formatted = state_name.replace(" ", "_")
-    url = f"https://ballotpedia.org/{state_formatted}_State_Senate_elections,_2024"
+    return f"https://ballotpedia.org/{state_formatted}_State_Senate_elections,_2024"
 
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
+def construct_senate_url(state_name):
+    state_formatted = state_name.replace(" ", "_")
+    return f"https://ballotpedia.org/United_States_Senate_election_in_{state_formatted},_2024"
 
-        voter_info = []
+def parse_voter_info(html):
+    soup = make_soup(html, VOTER_INFO_TAGS)
 
-        
-        widget_rows = soup.find_all('div', class_='vis_widget_row')
+    voter_info = []
 
-        
-        for row in widget_rows:
-            desc = row.find('div', class_='vis_widget_desc')
-            value = row.find('div', class_='vis_widget_value')
+    
+    widget_rows = soup.find_all('div', class_='vis_widget_row')
+
+    
+    for row in widget_rows:
+        desc = row.find('div', class_='vis_widget_desc')
+        value = row.find('div', class_='vis_widget_value')
 
-            if desc and value:
-                desc_text = desc.get_text(strip=True)
-                value_text = value.get_text(" | ", strip=True)  
-                voter_info.append({desc_text: value_text})
+        if desc and value:
+            desc_text = desc.get_text(strip=True)
+            value_text = value.get_text(" | ", strip=True)  
+            voter_info.append({desc_text: value_text})
 
-        return voter_info
+    return voter_info
+
+@memoize('voter_info', ELECTION_TTL)
+def scrape_voter_info(state_name):
+    url = construct_voter_info_url(state_name)
+
+    html = fetch_page(url)
+    if html is not None:
+        return memoized_parse(parse_voter_info, html)
     else:
-        print(f"Failed to access {url}")
         return []
 
+def parse_senate_candidates(html, state_name):
+    sections = SENATE_SPEC.extract(parse_tree(html))
+
+    candidates = []
+
+    for section in sections:
+        for row in section['rows']:
+            candidates.append({
+                'name': row['name'],
+                'party': row['party'],
+                'link': f"https://ballotpedia.org{row['href']}"
+            })
+
+    if not sections:
+        print(f"No general election section found for {state_name} Senate election.")
+
+    return candidates
+
+@memoize('senate', ELECTION_TTL)
 def scrape_senate_candidates(state_name):
-    
-    state_formatted = state_name.replace(" ", "_")
-    url = f"https://ballotpedia.org/United_States_Senate_election_in_{state_formatted},_2024"
-
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        candidates = []
-
-        
-        headers = soup.find_all('h5', class_='votebox-header-election-type')
-        found_general_election = False
-
-        for header in headers:
-            if 'general election' in header.get_text(strip=True).lower():
-                found_general_election = True
-                results_table = header.find_next('table')
-                if results_table:
-                    
-                    candidate_rows = results_table.find_all('tr', class_='results_row')[:2]
-                    for row in candidate_rows:
-                        candidate_name = row.find('a').get_text(strip=True)
-                        candidate_link = row.find('a')['href']
-                        candidate_party = row.find('td', class_='votebox-results-cell--text').get_text(strip=True)
-
-                        candidates.append({
-                            'name': candidate_name,
-                            'party': candidate_party,
-                            'link': f"https://ballotpedia.org{candidate_link}"
-                        })
-
-                    
-                    break
-
-        if not found_general_election:
-            print(f"No general election section found for {state_name} Senate election.")
-
-        return candidates
+    url = construct_senate_url(state_name)
+
+    # Only the first general-election votebox is read, so stop downloading after it.
+    stream = SpecStream(SENATE_SPEC, 'senate')
+    html = fetch_page(url, stream)
+    if html is not None:
+        return memoized_parse(parse_senate_candidates, html, state_name, tree=stream.tree)
     else:
-        print(f"Failed to access {url}")
         return []
 
-
 if __name__ == "__main__":
     state = input("Enter your state (e.g., Texas): ")
     voter_info = scrape_voter_info(state)
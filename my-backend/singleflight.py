@@ -0,0 +1,130 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import rate_limit
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: cross-process locking is skipped.
+    fcntl = None
+
+LOCK_DIR = os.environ.get('SCRAPE_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'civiccompass-locks'))
+LOCK_TIMEOUT = 30
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.priority = rate_limit.priority_context()
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller runs the function; callers that arrive while it is in
+    flight block and receive the same result (or exception). A caller with
+    a higher upstream priority than the first one promotes the call to it,
+    so a user's request doesn't wait at background priority.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            rate_limit.promote(call.priority, rate_limit.current_priority())
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+def _lock_path(key):
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    return os.path.join(LOCK_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock')
+
+
+def _try_lock(handle):
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextlib.contextmanager
+def file_lock(key, timeout=LOCK_TIMEOUT):
+    """Hold an exclusive advisory lock for key across every worker process on this host.
+
+    If the lock can't be taken within timeout (e.g. the holder is stuck), the
+    caller proceeds unlocked rather than waiting forever.
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    with open(_lock_path(key), 'a') as handle:
+        deadline = time.monotonic() + timeout
+        locked = _try_lock(handle)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.05)
+            locked = _try_lock(handle)
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@contextlib.asynccontextmanager
+async def file_lock_async(key, timeout=LOCK_TIMEOUT):
+    """file_lock for coroutines: waits for the lock without blocking the event loop."""
+    if fcntl is None:
+        yield False
+        return
+
+    with open(_lock_path(key), 'a') as handle:
+        deadline = time.monotonic() + timeout
+        locked = _try_lock(handle)
+        while not locked and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            locked = _try_lock(handle)
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(handle, fcntl.LOCK_UN)
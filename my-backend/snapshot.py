@@ -0,0 +1,193 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from house_scraper import district_label
+from result_cache import CachedResult, normalize_key
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_PATH = os.environ.get(
+    'SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'election_snapshot.json'),
+)
+
+# Sections of a snapshot and the scraper arguments each one is keyed by.
+SECTIONS = {
+    'house': ('state', 'district'),
+    'senate': ('state',),
+    'voter_info': ('state',),
+    'municipal': ('county', 'state'),
+    'bio': ('name',),
+}
+
+# What a section returns for a key the snapshot doesn't have, matching what
+# the live scrapers return for a missing page.
+EMPTY_VALUES = {
+    'house': [],
+    'senate': [],
+    'voter_info': [],
+    'municipal': {'candidates': [], 'demographics': []},
+    'bio': {'bio': 'No biography found.', 'image_url': None},
+}
+
+# How often, at most, a worker checks whether the snapshot file was replaced.
+RELOAD_CHECK_INTERVAL = int(os.environ.get('SNAPSHOT_RELOAD_INTERVAL', 10))
+
+
+def snapshot_key(*args):
+    """Section key for scraper arguments, normalized the same way as the result cache."""
+    return '|'.join(normalize_key(args))
+
+
+def new_version():
+    return time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+
+
+def write_snapshot(path, sections, version=None):
+    """Atomically write a snapshot file; readers see either the old file or the complete new one."""
+    document = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version or new_version(),
+        'created_at': time.time(),
+    }
+    for section in SECTIONS:
+        document[section] = sections.get(section, {})
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, tmp_path = tempfile.mkstemp(prefix='.snapshot-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump(document, f)
+        # mkstemp creates the file 0600; app workers may run as another user.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o644 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return document['version']
+
+
+def read_snapshot(path):
+    with open(path) as f:
+        document = json.load(f)
+    if document.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {document.get('format')!r} in {path}")
+    return document
+
+
+class _Index:
+    """Immutable lookup tables built from one snapshot document."""
+
+    def __init__(self, document, file_id):
+        self.version = document['version']
+        self.created_at = document['created_at']
+        self.file_id = file_id
+        self.loaded_at = time.time()
+
+        # by state: senate candidates and voter info
+        self.by_state = {}
+        for section in ('senate', 'voter_info'):
+            for key, value in document.get(section, {}).items():
+                self.by_state.setdefault(key, {})[section] = value
+
+        # by (state, district)
+        self.by_district = {}
+        for key, value in document.get('house', {}).items():
+            state, district = key.split('|')
+            self.by_district[(state, district)] = value
+
+        # by (county, state)
+        self.by_county = {}
+        for key, value in document.get('municipal', {}).items():
+            county, state = key.split('|')
+            self.by_county[(county, state)] = value
+
+        # by candidate name: the bio
+        self.by_candidate = dict(document.get('bio', {}))
+
+    def get(self, section, key):
+        if section == 'house':
+            return self.by_district.get(key)
+        if section in ('senate', 'voter_info'):
+            return self.by_state.get(key[0], {}).get(section)
+        if section == 'municipal':
+            return self.by_county.get(key)
+        if section == 'bio':
+            return self.by_candidate.get(key[0])
+        raise KeyError(section)
+
+
+class SnapshotStore:
+    """Serve scraper results from a prebuilt snapshot held in memory.
+
+    Lookups never touch the network. When the file on disk is replaced (the
+    crawler writes it with an atomic rename), the first lookup after the
+    check interval rebuilds the index and swaps the reference in one step,
+    so concurrent readers see either the old or the new snapshot, never a
+    mix, and workers pick up a new crawl without restarting.
+    """
+
+    def __init__(self, path, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._next_check = 0
+        self._index = None
+        self.reload()
+
+    def _file_id(self):
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        with self._reload_lock:
+            file_id = self._file_id()
+            if self._index is not None and self._index.file_id == file_id:
+                return False
+            index = _Index(read_snapshot(self.path), file_id)
+            self._index = index
+            print(f"Loaded election snapshot {index.version} from {self.path}")
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            self.reload()
+        except (OSError, ValueError) as e:
+            print(f"Keeping snapshot {self._index.version}; reload failed: {str(e)}")
+
+    def lookup(self, section, *args):
+        """CachedResult for a scraper call, aged from when the snapshot was built."""
+        self._maybe_reload()
+        index = self._index
+        if section == 'house':
+            # The crawl stores districts as '3rd'; requests may say '3' or 'District 3'.
+            state, district = args
+            args = (state, district_label(district) or district)
+        key = normalize_key(args)
+        value = index.get(section, key)
+        if value is None:
+            value = EMPTY_VALUES[section]
+        # A snapshot's values never change, so its version stands in for their content.
+        etag = '|'.join((index.version, section) + key)
+        return CachedResult(value, time.time() - index.created_at, False, etag)
+
+    def stats(self):
+        index = self._index
+        return {
+            'path': self.path,
+            'version': index.version,
+            'created_at': index.created_at,
+            'loaded_at': index.loaded_at,
+            'states': len(index.by_state),
+            'districts': len(index.by_district),
+            'counties': len(index.by_county),
+            'candidates': len(index.by_candidate),
+        }
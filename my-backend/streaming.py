@@ -0,0 +1,125 @@
+"""Stop downloading a page as soon as the part a scraper reads has arrived.
+
+The House and Senate scrapers only read the first general-election votebox,
+which sits near the top of a page that goes on for hundreds of KB. A
+SpecStream is handed to fetch_page. It feeds the response body, chunk by
+chunk, to lxml's incremental HTML parser and reports done once the spec's
+first section and the table after it have been closed. fetch_page then
+drops the connection. What was read is cached as a partial page, which
+only streamed fetches are served (see page_cache.put), and the tree built
+along the way is parsed by the scraper directly (see
+parsing.memoized_parse), so the prefix isn't parsed twice.
+
+The body is fed in fixed STREAM_CHUNK pieces, so two downloads of an
+unchanged page stop at the same byte. The cached prefix then keeps the same
+fingerprint, and the page cache and parse memo still recognise it.
+
+Set STREAMING_PARSE=0 to always download whole pages.
+"""
+import os
+import threading
+
+from lxml import etree
+
+STREAMING_PARSE = os.environ.get('STREAMING_PARSE', '1') != '0'
+STREAM_CHUNK = 16 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+class SpecStream:
+    def __init__(self, spec, page_type):
+        self.spec = spec
+        self.page_type = page_type
+        self.done = False
+        self.tree = None
+        self._parser = None
+        self._pending = b''
+
+    def start(self, encoding):
+        self._parser = etree.HTMLPullParser(events=('end',), tag='table', encoding=encoding)
+
+    def feed(self, data):
+        """Feed more of the body; returns True once the rest of the page isn't needed."""
+        self._pending += data
+        while len(self._pending) >= STREAM_CHUNK and not self.done:
+            chunk, self._pending = self._pending[:STREAM_CHUNK], self._pending[STREAM_CHUNK:]
+            self._feed_chunk(chunk)
+        return self.done
+
+    def _feed_chunk(self, chunk):
+        self._parser.feed(chunk)
+        for _, table in self._parser.read_events():
+            if self._has_section(table):
+                self.done = True
+
+    def _has_section(self, table):
+        anchors = self.spec.sections(table.getroottree())
+        if not anchors:
+            return False
+        tables = self.spec.table(anchors[0])
+        return bool(tables) and tables[0] is table
+
+    def finish(self, body):
+        """Build the tree from what was fed; returns the part of body the tree was built from.
+
+        A page that ended before the section was found is parsed to the end.
+        Otherwise whatever arrived past the chunk that completed the section
+        is dropped.
+        """
+        if self.done:
+            body = body[:len(body) - len(self._pending)]
+        elif self._pending:
+            self._feed_chunk(self._pending)
+        self._pending = b''
+        try:
+            self.tree = self._parser.close()
+        except etree.XMLSyntaxError:
+            # Empty body; the scraper parses (and rejects) it the usual way.
+            self.tree = None
+        return body
+
+
+def read(stream, chunks, encoding):
+    """Feed a response's decoded byte chunks to stream until it is done. Returns the body read, as bytes."""
+    stream.start(encoding)
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        if stream.feed(chunk):
+            break
+    return stream.finish(b''.join(body))
+
+
+async def read_async(stream, chunks, encoding):
+    stream.start(encoding)
+    body = []
+    async for chunk in chunks:
+        body.append(chunk)
+        if stream.feed(chunk):
+            break
+    return stream.finish(b''.join(body))
+
+
+def record(page_type, stopped_early, wire_bytes, content_length):
+    """Count one streamed download: bytes that came over the wire, and what the whole page would have been."""
+    with _stats_lock:
+        entry = _stats.setdefault(page_type, {
+            'pages': 0, 'stopped_early': 0, 'bytes_read': 0, 'bytes_saved': 0, 'bytes_saved_unknown': 0,
+        })
+        entry['pages'] += 1
+        entry['bytes_read'] += wire_bytes
+        if stopped_early:
+            entry['stopped_early'] += 1
+            if content_length is not None:
+                entry['bytes_saved'] += max(0, content_length - wire_bytes)
+            else:
+                # Chunked responses don't say how long the rest would have been.
+                entry['bytes_saved_unknown'] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        page_types = {page_type: dict(entry) for page_type, entry in _stats.items()}
+    return {'enabled': STREAMING_PARSE, 'page_types': page_types}
@@ -0,0 +1,37 @@
+"""/api/candidate_bios input checks, through the Flask test client."""
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def lookup_bios(pairs):
+        return {name: {'status': 'ok', 'role': role} for name, role in pairs}, []
+
+    monkeypatch.setattr(backend, 'lookup_bios', lookup_bios)
+    return backend.app.test_client()
+
+
+@pytest.mark.parametrize('candidate', [
+    {'name': ['Ted Cruz'], 'role': 'Senator'},
+    {'name': 'Ted Cruz', 'role': {'title': 'Senator'}},
+    {'name': 'Ted Cruz'},
+    ['Ted Cruz', 3],
+    'Ted Cruz',
+])
+def test_malformed_candidates_are_rejected(client, candidate):
+    response = client.post('/api/candidate_bios', json={'candidates': [candidate]})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Candidate name and role are required'}
+
+
+def test_well_formed_candidates_are_looked_up(client):
+    response = client.post('/api/candidate_bios', json={'candidates': [
+        {'name': 'Ted Cruz', 'role': 'Senator'}, ['Keith Self', 'Representative'],
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['bios'] == {
+        'Ted Cruz': {'status': 'ok', 'role': 'Senator'},
+        'Keith Self': {'status': 'ok', 'role': 'Representative'},
+    }
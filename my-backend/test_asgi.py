@@ -0,0 +1,85 @@
+"""The ASGI app's routing, headers and /api/elections, with the async scrapers stubbed out."""
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from result_cache import CachedResult
+
+
+def call(path, query='', method='GET', headers=()):
+    """Run one request through asgi.app; returns (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http',
+        'path': path,
+        'method': method,
+        'query_string': query.encode(),
+        'headers': [(name.encode(), value.encode()) for name, value in headers],
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+
+@pytest.fixture
+def scrapers(monkeypatch):
+    """Stub the election scrapers; voter info fails."""
+    async def house(state, district):
+        return CachedResult([{'name': 'Keith Self'}], 30, False)
+
+    async def senate(state):
+        return CachedResult([{'name': 'Ted Cruz'}], 0, True)
+
+    async def voter_info(state):
+        raise ValueError('voter info page failed to load')
+
+    monkeypatch.setattr(asgi, 'snapshot_store', None)
+    monkeypatch.setattr(asgi, 'scrape_house_candidates_async', house)
+    monkeypatch.setattr(asgi, 'scrape_senate_candidates_async', senate)
+    monkeypatch.setattr(asgi, 'scrape_voter_info_async', voter_info)
+
+
+def test_unknown_paths_methods_and_missing_params():
+    assert call('/api/nothing')[0] == 404
+    assert call('/api/elections', method='POST')[0] == 405
+    assert call('/api/elections', method='OPTIONS')[0] == 200
+    status, _, body = call('/api/elections', 'state=Texas')
+    assert status == 400
+    assert json.loads(body) == {'error': 'State and district are required'}
+
+
+def test_repeated_headers_are_joined():
+    scope = {'headers': [(b'Accept', b'text/html'), (b'accept', b'application/x-ndjson')]}
+    assert asgi.request_headers(scope) == {'accept': 'text/html, application/x-ndjson'}
+
+
+def test_elections_returns_what_finished(scrapers):
+    status, headers, body = call('/api/elections', 'state=Texas&district=3rd')
+    payload = json.loads(body)
+    assert status == 200
+    assert headers['age'] == '30'
+    assert payload['houseCandidates'] == [{'name': 'Keith Self'}]
+    assert payload['voterInfo'] == []
+    assert payload['stale'] is True
+    assert set(payload['errors']) == {'voterInfo'}
+
+
+def test_elections_streams_when_accept_asks_for_it(scrapers):
+    status, headers, body = call('/api/elections', 'state=Texas&district=3rd',
+                                 headers=[('Accept', 'application/x-ndjson')])
+    events = [json.loads(line) for line in body.decode().splitlines()]
+    assert status == 200
+    assert headers['content-type'] == 'application/x-ndjson'
+    assert events[0] == {'sections': ['houseCandidates', 'senateCandidates', 'voterInfo']}
+    assert {event['section'] for event in events[1:-1]} == {'houseCandidates', 'senateCandidates', 'voterInfo'}
+    assert events[-1]['done'] and set(events[-1]['errors']) == {'voterInfo'}
@@ -0,0 +1,62 @@
+"""fetch_page_async against an in-process fault_server."""
+import asyncio
+import threading
+
+import async_scrapers
+import page_cache
+import resilience
+
+
+def fetch(*urls):
+    async def run():
+        try:
+            return await asyncio.gather(*(async_scrapers.fetch_page_async(url) for url in urls))
+        finally:
+            await async_scrapers.close_client()
+    return asyncio.run(run())
+
+
+def test_fetches_once_and_then_serves_the_cache(upstream, cache):
+    server = upstream()
+    url = server.url('/Async_page')
+
+    first, second = fetch(url, url)
+    assert first == second and 'Stand-in page for /Async_page' in first
+    assert fetch(url) == [first]
+    assert server.requests == 1
+    assert cache.get(url) == first
+
+
+def test_serves_stale_copy_when_host_is_down(upstream, cache, monkeypatch):
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 0)
+    server = upstream('--error-rate', '1')
+    url = server.url('/Async_stale')
+    cache.put(url, '<html>old copy</html>')
+    cache._connect().execute('UPDATE pages SET fetched_at = 0 WHERE url = ?', (url,))
+
+    assert fetch(url) == ['<html>old copy</html>']
+
+
+def test_page_cache_is_used_off_the_event_loop(upstream, cache, monkeypatch):
+    server = upstream()
+    loop_threads = set()
+    cache_threads = set()
+
+    def record(fn):
+        def wrapper(*args, **kwargs):
+            cache_threads.add(threading.get_ident())
+            return fn(*args, **kwargs)
+        return wrapper
+
+    for name in ('get', 'get_validators', 'put'):
+        monkeypatch.setattr(page_cache, name, record(getattr(page_cache, name)))
+
+    async def run():
+        loop_threads.add(threading.get_ident())
+        try:
+            return await async_scrapers.fetch_page_async(server.url('/Off_the_loop'))
+        finally:
+            await async_scrapers.close_client()
+
+    assert asyncio.run(run())
+    assert cache_threads and not cache_threads & loop_threads
@@ -0,0 +1,28 @@
+"""Civic lookups must keep the API key and the user's address out of responses."""
+import socket
+
+import app as backend
+import civic
+import resilience
+
+ADDRESS = '1600 Secret Lane, Plano, TX'
+KEY = 'not-a-real-civic-key'
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_connection_errors_do_not_leak_the_key_or_address(monkeypatch, capsys):
+    monkeypatch.setattr(civic, 'CIVIC_API_BASE', f'http://127.0.0.1:{closed_port()}/civicinfo/v2')
+    monkeypatch.setattr(civic, 'CIVIC_API_KEY', KEY)
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 0)
+
+    response = backend.app.test_client().get('/api/representatives', query_string={'address': ADDRESS})
+    assert response.status_code == 500
+    logs = capsys.readouterr().out
+    for text in (response.get_data(as_text=True), logs):
+        assert KEY not in text
+        assert 'secret' not in text.lower()
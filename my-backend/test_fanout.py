@@ -0,0 +1,104 @@
+"""Deadlines and dependencies in fanout's stage runners."""
+import threading
+import time
+
+import pytest
+
+from fanout import iter_graph, run_graph, run_stages
+
+
+def sleeper(seconds, value):
+    def run(**_):
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def test_run_stages_reports_timeouts_and_errors():
+    def failing():
+        raise ValueError('bad page')
+
+    results, errors = run_stages(
+        {'fast': sleeper(0, 1), 'slow': sleeper(1, 2), 'broken': failing},
+        timeouts={'slow': 0.1},
+    )
+    assert results == {'fast': 1}
+    assert errors == {'slow': 'timeout', 'broken': 'bad page'}
+
+
+def test_run_stages_limits_concurrency():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def stage():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return True
+
+    results, errors = run_stages({name: stage for name in 'abcdef'}, max_concurrency=2)
+    assert len(results) == 6 and not errors
+    assert max(peak) <= 2
+
+
+def test_iter_graph_passes_results_to_dependents():
+    stages = {
+        'location': ((), lambda: 'Texas'),
+        'senate': (('location',), lambda location: f'senate:{location}'),
+        'bios': (('senate',), lambda senate: f'bios:{senate}'),
+    }
+    outcomes = list(iter_graph(stages))
+    assert [name for name, _, _ in outcomes] == ['location', 'senate', 'bios']
+    assert outcomes[-1] == ('bios', 'bios:senate:Texas', None)
+
+
+def test_iter_graph_yields_each_stage_as_it_settles():
+    stages = {'slow': ((), sleeper(0.3, 'slow')), 'fast': ((), sleeper(0, 'fast'))}
+    started = time.monotonic()
+    outcomes = iter_graph(stages)
+    assert next(outcomes) == ('fast', 'fast', None)
+    assert time.monotonic() - started < 0.2
+    assert next(outcomes) == ('slow', 'slow', None)
+
+
+def test_iter_graph_deadlines_count_from_the_start():
+    stages = {
+        'first': ((), sleeper(0.2, 1)),
+        # Quick itself, but it can't start until first is done, after its deadline.
+        'second': (('first',), sleeper(0, 2)),
+        'other': ((), sleeper(1, 3)),
+    }
+    started = time.monotonic()
+    results, errors = run_graph(stages, timeouts={'first': 1, 'second': 0.1, 'other': 0.3})
+    assert results == {'first': 1}
+    assert errors == {'second': 'timeout', 'other': 'timeout'}
+    # The slow stage is given up on at its deadline, not waited for.
+    assert time.monotonic() - started < 0.8
+
+
+def test_iter_graph_skips_stages_whose_dependency_failed():
+    def failing():
+        raise ValueError('No representatives found for this address')
+
+    stages = {
+        'representatives': ((), failing),
+        'house': (('representatives',), lambda representatives: 'house'),
+        'houseBios': (('house',), lambda house: 'bios'),
+        'voterInfo': ((), lambda: 'info'),
+    }
+    results, errors = run_graph(stages)
+    assert results == {'voterInfo': 'info'}
+    assert errors == {
+        'representatives': 'error',
+        'house': 'representatives failed',
+        'houseBios': 'house failed',
+    }
+
+
+def test_iter_graph_rejects_unknown_dependencies():
+    with pytest.raises(ValueError):
+        run_graph({'house': (('missing',), lambda missing: None)})
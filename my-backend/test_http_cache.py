@@ -0,0 +1,79 @@
+"""ETags, 304s and Cache-Control for API responses."""
+import gzip
+import json
+
+import pytest
+
+import app as backend
+import http_cache
+from result_cache import CachedResult
+
+PAYLOAD = {'houseCandidates': [{'name': 'Keith Self'}], 'filler': 'x' * 2048}
+PARTS = [CachedResult(PAYLOAD['houseCandidates'], 120, False, 'abc123')]
+
+
+def respond(headers=None, payload=PAYLOAD, parts=PARTS):
+    """cached_response for a request to /api/elections, with the after_request hooks applied."""
+    with backend.app.test_request_context('/api/elections?state=Texas', headers=headers or {}):
+        response = backend.cached_response(payload, parts)
+        return backend.app.process_response(response)
+
+
+def test_response_etag_depends_on_parts_not_order():
+    first = CachedResult([1], 0, False, 'a')
+    second = CachedResult([2], 0, False, 'b')
+    assert http_cache.response_etag([first, second]) == http_cache.response_etag([second, first])
+    assert http_cache.response_etag([first]) != http_cache.response_etag([first._replace(stale=True)])
+    assert http_cache.response_etag([first, CachedResult([3], 0, False)]) is None
+
+
+def test_tagged_response_has_cache_headers():
+    response = respond()
+    etag, weak = response.get_etag()
+    assert etag == http_cache.response_etag(PARTS) and not weak
+    assert response.headers['Age'] == '120'
+    policy = http_cache.ROUTE_POLICIES['get_election_data']
+    assert response.headers['Cache-Control'] == http_cache.cache_control(policy, 120)
+    assert json.loads(response.get_data()) == dict(PAYLOAD, stale=False)
+
+
+def test_matching_if_none_match_gets_a_304():
+    etag = respond().get_etag()[0]
+    response = respond({'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.get_etag()[0] == etag
+
+
+def test_weak_if_none_match_gets_a_304():
+    # Proxies that recompress a response weaken its tag.
+    etag = respond().get_etag()[0]
+    response = respond({'If-None-Match': f'"other", W/"{etag}"'})
+    assert response.status_code == 304
+
+
+def test_other_etag_gets_the_body():
+    response = respond({'If-None-Match': '"something-else"'})
+    assert response.status_code == 200
+    assert response.get_data()
+
+
+def test_compressed_body_has_its_own_etag():
+    response = respond({'Accept-Encoding': 'gzip'})
+    etag = response.get_etag()[0]
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert etag.endswith('-gzip')
+    assert json.loads(gzip.decompress(response.get_data())) == dict(PAYLOAD, stale=False)
+
+    revalidated = respond({'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.parametrize('payload, parts', [
+    (dict(PAYLOAD, errors={'senateCandidates': 'timeout'}), PARTS),
+    (PAYLOAD, [CachedResult([], 0, False)]),
+])
+def test_incomplete_responses_are_not_stored(payload, parts):
+    response = respond(payload=payload, parts=parts)
+    assert response.get_etag() == (None, None)
+    assert response.headers['Cache-Control'] == http_cache.NO_STORE
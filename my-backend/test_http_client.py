@@ -0,0 +1,32 @@
+"""Conditional GETs for expired pages, against an in-process fault_server."""
+import http_client
+import page_cache
+
+
+def expire(url):
+    page_cache._connect().execute('UPDATE pages SET fetched_at = 0 WHERE url = ?', (url,))
+
+
+def test_expired_page_is_revalidated_with_a_conditional_get(upstream, cache):
+    server = upstream('--validators')
+    url = server.url('/Revalidated')
+    body = http_client.fetch_page(url)
+    expire(url)
+    before = cache.get_stats()['not_modified']
+
+    assert http_client.fetch_page(url) == body
+    assert cache.get_stats()['not_modified'] == before + 1
+    assert server.requests == 2
+    assert cache.get(url) == body
+
+
+def test_page_without_validators_is_downloaded_again(upstream, cache):
+    server = upstream()
+    url = server.url('/No_validators')
+    body = http_client.fetch_page(url)
+    expire(url)
+    before = cache.get_stats()['not_modified']
+
+    assert http_client.fetch_page(url) == body
+    assert cache.get_stats()['not_modified'] == before
+    assert server.requests == 2
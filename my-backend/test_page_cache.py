@@ -0,0 +1,44 @@
+"""Keeping the page cache file bounded."""
+import time
+
+import page_cache
+
+
+def age(url, seconds):
+    page_cache._connect().execute('UPDATE pages SET fetched_at = ? WHERE url = ?', (time.time() - seconds, url))
+
+
+def urls():
+    return [row[0] for row in page_cache._connect().execute('SELECT url FROM pages ORDER BY url')]
+
+
+def test_prune_drops_pages_past_the_max_age(cache):
+    cache.put('https://ballotpedia.org/Old', '<html>old</html>')
+    cache.put('https://ballotpedia.org/Recent', '<html>recent</html>')
+    age('https://ballotpedia.org/Old', cache.PAGE_CACHE_MAX_AGE + 60)
+    age('https://ballotpedia.org/Recent', 3600)
+
+    assert cache.prune() == 1
+    assert urls() == ['https://ballotpedia.org/Recent']
+
+
+def test_prune_keeps_the_most_recently_fetched_rows(cache, monkeypatch):
+    monkeypatch.setattr(page_cache, 'PAGE_CACHE_MAX_ROWS', 2)
+    for number in range(4):
+        cache.put(f'https://ballotpedia.org/Page_{number}', '<html></html>')
+        age(f'https://ballotpedia.org/Page_{number}', 100 - number)
+    cache.touch('https://ballotpedia.org/Page_0', 'not_modified')
+
+    assert cache.prune() == 2
+    assert urls() == ['https://ballotpedia.org/Page_0', 'https://ballotpedia.org/Page_3']
+
+
+def test_writes_prune_every_so_often(cache, monkeypatch):
+    monkeypatch.setattr(page_cache, 'PAGE_CACHE_MAX_ROWS', 3)
+    monkeypatch.setattr(page_cache, 'PRUNE_EVERY', 5)
+    monkeypatch.setitem(page_cache._stats, 'writes', 0)
+    for number in range(5):
+        cache.put(f'https://ballotpedia.org/Page_{number}', '<html></html>')
+        age(f'https://ballotpedia.org/Page_{number}', 100 - number)
+
+    assert len(urls()) == 3
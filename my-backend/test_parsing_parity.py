@@ -0,0 +1,65 @@
+"""The compiled extraction specs give what the BeautifulSoup loops they replaced gave.
+
+The loops are kept in bench_parsing as reference_* functions. Both run over
+the saved pages in sample_pages/, under each parser mode the loops could
+run with.
+"""
+import os
+
+import pytest
+
+import parsing
+from bench_parsing import (MODES, reference_house_candidates, reference_municipal_candidates,
+                           reference_senate_candidates)
+from house_scraper import parse_house_candidates
+from municipal_scraper import parse_municipal_candidates
+from senate_scraper import parse_senate_candidates
+
+SAMPLE_PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_pages')
+PAGE_NAMES = sorted(os.listdir(SAMPLE_PAGES))
+
+HOUSE_PAGE = "Texas%27s_3rd_Congressional_District_election,_2024"
+SENATE_PAGE = 'United_States_Senate_election_in_Texas,_2024'
+MUNICIPAL_PAGE = 'Municipal_elections_in_Collin_County,_Texas_(2024)'
+
+
+def sample(name):
+    with open(os.path.join(SAMPLE_PAGES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture(params=MODES, ids=[label for label, _, _ in MODES])
+def parser_mode(request, monkeypatch):
+    _, parser_name, restrict = request.param
+    monkeypatch.setattr(parsing, 'PARSER', parser_name)
+    monkeypatch.setattr(parsing, 'RESTRICT_TREE', restrict)
+
+
+@pytest.mark.parametrize('name', PAGE_NAMES)
+def test_house_spec_matches_the_old_loop(name, parser_mode):
+    html = sample(name)
+    assert parse_house_candidates(html) == reference_house_candidates(html)
+
+
+@pytest.mark.parametrize('name', PAGE_NAMES)
+def test_senate_spec_matches_the_old_loop(name, parser_mode):
+    html = sample(name)
+    assert parse_senate_candidates(html, 'Texas') == reference_senate_candidates(html, 'Texas')
+
+
+@pytest.mark.parametrize('name', PAGE_NAMES)
+def test_municipal_specs_match_the_old_loop(name, parser_mode):
+    html = sample(name)
+    assert parse_municipal_candidates(html) == reference_municipal_candidates(html)
+
+
+def test_sample_pages_have_something_to_compare():
+    assert [c['name'] for c in parse_house_candidates(sample(HOUSE_PAGE))] == ['Keith Self', 'Sandeep Srivastava']
+    assert parse_senate_candidates(sample(SENATE_PAGE), 'Texas')[0] == {
+        'name': 'Ted Cruz', 'party': 'Ted Cruz(R)', 'link': 'https://ballotpedia.org/Ted_Cruz',
+    }
+    municipal = parse_municipal_candidates(sample(MUNICIPAL_PAGE))
+    assert [c['name'] for c in municipal['candidates']] == [
+        'Cheryl Williams', 'Tracy Weathers', 'Jim Skinner', 'Scott Grigg', 'Lisa Moore',
+    ]
+    assert [row['label'] for row in municipal['demographics']] == ['Population', 'Land area (sq mi)', 'White']
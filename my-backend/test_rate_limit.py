@@ -0,0 +1,170 @@
+"""Per-host limiter queueing, priorities, AIMD and the buckets shared between processes."""
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import rate_limit
+from rate_limit import BACKGROUND, INTERACTIVE, QueueTimeout, priority
+from singleflight import SingleFlight
+
+# Takes slots as fast as the limiter allows for a second from a shared
+# start time, then prints how many it got.
+SHARED_CLIENT = """
+import sys, time
+import rate_limit
+limiter = rate_limit.HostLimiter('shared.test', rate=10)
+start = float(sys.argv[1])
+time.sleep(max(0, start - time.time()))
+count = 0
+while time.time() < start + 1:
+    slot = limiter.acquire()
+    slot.record(200)
+    limiter.release(slot)
+    count += 1
+print(count)
+"""
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A limiter with plenty of tokens that lets one request through at a time."""
+    monkeypatch.setattr(rate_limit, '_shared', None)
+    host_limiter = rate_limit.HostLimiter('limiter.test', rate=1000, max_concurrency=1)
+    host_limiter.concurrency = 1
+    host_limiter.tokens = 1000
+    monkeypatch.setitem(rate_limit._limiters, host_limiter.host, host_limiter)
+    return host_limiter
+
+
+def queue_behind(limiter, level, granted):
+    """Start a thread that takes a slot at level, appending its name to granted when it gets one."""
+    ready = threading.Event()
+
+    def run():
+        with priority(level):
+            ready.context = rate_limit.priority_context()
+            ready.set()
+            slot = limiter.acquire(timeout=5)
+        granted.append(name)
+        limiter.release(slot)
+
+    name = f'{len(limiter._waiters)}'
+    thread = threading.Thread(target=run)
+    thread.start()
+    ready.wait()
+    while not any(waiter.priority is ready.context for _, _, waiter in list(limiter._waiters)):
+        time.sleep(0.01)
+    return thread, ready.context
+
+
+def take(limiter, status):
+    slot = limiter.acquire()
+    slot.record(status)
+    limiter.release(slot)
+
+
+def test_failures_halve_the_limits_and_successes_raise_them_a_little(monkeypatch):
+    monkeypatch.setattr(rate_limit, '_shared', None)
+    limiter = rate_limit.HostLimiter('aimd.test', rate=10, max_concurrency=8)
+
+    take(limiter, 503)
+    assert (limiter.rate, limiter.concurrency) == (5, 4)
+    # Failures inside the cooldown were already in flight; they don't count again.
+    take(limiter, 429)
+    assert (limiter.rate, limiter.concurrency) == (5, 4)
+    assert limiter.stats()['backoffs'] == 1
+
+    take(limiter, 200)
+    assert (limiter.rate, limiter.concurrency) == (5.5, 4.25)
+
+
+def test_interactive_callers_go_before_background_ones(limiter):
+    held = limiter.acquire()
+    granted = []
+    background, _ = queue_behind(limiter, BACKGROUND, granted)
+    interactive, _ = queue_behind(limiter, INTERACTIVE, granted)
+
+    limiter.release(held)
+    background.join()
+    interactive.join()
+    assert granted == ['1', '0']
+
+
+def test_waiting_too_long_raises_queue_timeout(limiter):
+    held = limiter.acquire()
+    with pytest.raises(QueueTimeout):
+        limiter.acquire(timeout=0.05)
+    with pytest.raises(QueueTimeout):
+        asyncio.run(limiter.acquire_async(timeout=0.05))
+    assert limiter.stats()['timeouts'] == 2
+    assert not limiter._waiters
+    limiter.release(held)
+
+
+def test_waiter_is_served_when_its_token_comes_due(limiter):
+    held = limiter.acquire()
+    granted = []
+    waiter, _ = queue_behind(limiter, INTERACTIVE, granted)
+    # The slot frees up before a token does; nothing else will call again.
+    limiter.tokens = 0
+    limiter.rate = 20
+    started = time.monotonic()
+    limiter.release(held)
+    waiter.join()
+    assert granted == ['0']
+    assert time.monotonic() - started < 1
+
+
+def test_processes_share_one_budget(tmp_path):
+    env = dict(os.environ, RATE_LIMIT_PATH=str(tmp_path / 'shared.sqlite3'), SHARED_RATE_LIMIT='1',
+               PYTHONPATH=os.path.dirname(os.path.abspath(rate_limit.__file__)))
+    start = str(time.time() + 2)
+    clients = [subprocess.Popen([sys.executable, '-c', SHARED_CLIENT, start],
+                                env=env, stdout=subprocess.PIPE, text=True)
+               for _ in range(2)]
+    counts = [int(client.communicate(timeout=30)[0]) for client in clients]
+    # One process alone gets about 11 (the first token plus 10 a second).
+    assert all(counts)
+    assert sum(counts) <= 15
+
+
+def test_promote_moves_queued_fetches_ahead(limiter):
+    held = limiter.acquire()
+    granted = []
+    first, _ = queue_behind(limiter, BACKGROUND, granted)
+    second, context = queue_behind(limiter, BACKGROUND, granted)
+
+    rate_limit.promote(context)
+    limiter.release(held)
+    first.join()
+    second.join()
+    assert granted == ['1', '0']
+
+
+def test_joining_a_background_flight_promotes_it():
+    flight = SingleFlight()
+    started = threading.Event()
+    results = []
+
+    def leader_fn():
+        started.set()
+        deadline = time.monotonic() + 5
+        while rate_limit.current_priority() != INTERACTIVE and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return rate_limit.current_priority()
+
+    def leader():
+        with priority(BACKGROUND):
+            results.append(flight.do('key', leader_fn))
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    assert flight.do('key', leader_fn) == INTERACTIVE
+    thread.join()
+    assert results == [INTERACTIVE]
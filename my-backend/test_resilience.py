@@ -0,0 +1,113 @@
+"""Retries, circuit breakers and stale fallback against an in-process fault_server."""
+import time
+
+import pytest
+import requests
+
+import http_client
+import page_cache
+import resilience
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, 'BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 2)
+
+
+def breaker(server, **options):
+    """Install a breaker with test settings for the server's host."""
+    url = server.url()
+    host = resilience.breaker_for(url).host
+    resilience._breakers[host] = resilience.CircuitBreaker(host, **options)
+    return resilience._breakers[host]
+
+
+def expire(url):
+    page_cache._connect().execute('UPDATE pages SET fetched_at = 0 WHERE url = ?', (url,))
+
+
+def test_retries_until_the_host_recovers(upstream, fast_retries):
+    server = upstream('--fail-first', '2')
+    response = resilience.get(requests.Session(), server.url())
+    assert response.status_code == 200
+    assert server.requests == 3
+    assert resilience.breaker_for(server.url()).stats()['retries'] == 2
+
+
+def test_gives_up_after_max_retries(upstream, fast_retries):
+    server = upstream('--error-rate', '1')
+    response = resilience.get(requests.Session(), server.url())
+    assert response.status_code == 503
+    assert server.requests == resilience.MAX_RETRIES + 1
+    assert resilience.breaker_for(server.url()).stats()['gave_up'] == 1
+
+
+def test_backoff_waits_for_retry_after():
+    assert resilience.backoff_delay(0, retry_after=3) >= 3
+    assert resilience.backoff_delay(0, retry_after=600) == resilience.BACKOFF_CAP
+    for attempt in range(5):
+        ceiling = min(resilience.BACKOFF_CAP, resilience.BACKOFF_BASE * 2 ** attempt)
+        assert 0 <= resilience.backoff_delay(attempt) <= ceiling
+
+
+def test_breaker_opens_then_probes_then_closes(upstream, monkeypatch):
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 0)
+    server = upstream('--fail-first', '2')
+    host_breaker = breaker(server, failure_threshold=2, reset_timeout=0.2)
+    session = requests.Session()
+
+    for _ in range(2):
+        assert resilience.get(session, server.url()).status_code == 503
+    assert host_breaker.state == resilience.OPEN
+    with pytest.raises(resilience.CircuitOpen):
+        resilience.get(session, server.url())
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    # The first request after the reset timeout is the half-open probe;
+    # a second one is turned away until it answers.
+    host_breaker.before_request()
+    assert host_breaker.state == resilience.HALF_OPEN
+    with pytest.raises(resilience.CircuitOpen):
+        host_breaker.before_request()
+    host_breaker.cancel_attempt()
+
+    assert resilience.get(session, server.url()).status_code == 200
+    assert host_breaker.state == resilience.CLOSED
+    assert host_breaker.stats()['opened'] == 1
+
+
+def test_failed_probe_opens_the_breaker_again(upstream, monkeypatch):
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 0)
+    server = upstream('--error-rate', '1')
+    host_breaker = breaker(server, failure_threshold=1, reset_timeout=0.1)
+    session = requests.Session()
+
+    resilience.get(session, server.url())
+    time.sleep(0.15)
+    resilience.get(session, server.url())
+    assert host_breaker.state == resilience.OPEN
+    assert server.requests == 2
+
+
+def test_serves_stale_copy_when_host_is_down(upstream, fast_retries, cache):
+    server = upstream('--error-rate', '1')
+    url = server.url('/Stale_page')
+    cache.put(url, '<html>old copy</html>')
+    expire(url)
+
+    assert cache.get(url) is None
+    assert http_client.fetch_page(url) == '<html>old copy</html>'
+    assert resilience.breaker_for(url).stats()['fallbacks'] == 1
+
+
+def test_raises_when_host_is_down_and_nothing_is_cached(upstream, cache, monkeypatch):
+    monkeypatch.setattr(resilience, 'MAX_RETRIES', 0)
+    server = upstream('--error-rate', '1')
+    breaker(server, failure_threshold=1, reset_timeout=60)
+    url = server.url('/Never_fetched')
+    resilience.get(requests.Session(), url)
+
+    with pytest.raises(resilience.CircuitOpen):
+        http_client.fetch_page(url)
@@ -0,0 +1,132 @@
+"""The LRU result cache and memoize's stale-while-revalidate."""
+import threading
+import time
+
+import pytest
+
+import result_cache
+from result_cache import LRUCache, memoize
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, max_bytes=1024)
+    cache.set(('ns', 'a'), 'A', 60)
+    cache.set(('ns', 'b'), 'B', 60)
+    cache.get(('ns', 'a'))
+    cache.set(('ns', 'c'), 'C', 60)
+
+    assert cache.contains(('ns', 'a'))
+    assert not cache.contains(('ns', 'b'))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_bounds_bytes():
+    cache = LRUCache(max_entries=100, max_bytes=30)
+    cache.set(('ns', 'a'), 'x' * 10, 60)
+    cache.set(('ns', 'b'), 'y' * 10, 60)
+    cache.set(('ns', 'too big'), 'z' * 100, 60)
+
+    assert not cache.contains(('ns', 'too big'))
+    cache.set(('ns', 'c'), 'w' * 10, 60)
+    assert not cache.contains(('ns', 'a'))
+    assert cache.stats()['bytes'] <= 30
+
+
+def test_lru_counts_stale_hits():
+    cache = LRUCache(max_entries=10, max_bytes=1024)
+    cache.set(('ns', 'a'), 'A', -1)
+    assert cache.get(('ns', 'a'))['value'] == 'A'
+    assert cache.get(('ns', 'missing')) is None
+    assert cache.stats()['namespaces']['ns'] == {'hits': 0, 'stale_hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+
+@pytest.fixture
+def namespace(request):
+    return f'test_{request.node.name}'
+
+
+def test_memoize_normalizes_keys(namespace):
+    calls = []
+
+    @memoize(namespace, 60)
+    def scrape(state):
+        calls.append(state)
+        return [state]
+
+    assert scrape('New_York') == ['New_York']
+    assert scrape(' new york ') == ['New_York']
+    assert calls == ['New_York']
+    assert scrape.cached('NEW YORK')
+
+
+def test_memoize_serves_stale_while_revalidating(namespace):
+    calls = []
+    release = threading.Event()
+
+    @memoize(namespace, 0.1)
+    def scrape(state):
+        calls.append(state)
+        if len(calls) == 1:
+            return ['old']
+        release.wait(2)
+        return ['new']
+
+    first = scrape.lookup('Texas')
+    assert first.value == ['old'] and not first.stale
+    time.sleep(0.15)
+
+    stale = scrape.lookup('Texas')
+    assert stale.value == ['old'] and stale.stale
+    assert stale.etag == first.etag
+
+    # Only one refresh runs however many stale reads there are.
+    wait_for(lambda: len(calls) == 2)
+    assert scrape.lookup('Texas').value == ['old']
+    time.sleep(0.05)
+    assert len(calls) == 2
+
+    release.set()
+    wait_for(lambda: scrape.lookup('Texas').value == ['new'])
+    assert scrape.lookup('Texas').etag != first.etag
+
+
+def test_memoize_keeps_old_value_when_refetch_comes_back_empty(namespace):
+    calls = []
+
+    @memoize(namespace, 0.1)
+    def scrape(state):
+        calls.append(state)
+        return ['Keith Self'] if len(calls) == 1 else []
+
+    scrape('Texas')
+    time.sleep(0.15)
+    assert scrape.lookup('Texas').stale
+
+    wait_for(lambda: len(calls) == 2 and not result_cache.get_stats()['background_refresh']['in_progress'])
+    assert scrape('Texas') == ['Keith Self']
+
+
+def test_failed_refresh_is_not_retried_on_every_hit(namespace):
+    calls = []
+
+    @memoize(namespace, 0.1)
+    def scrape(state):
+        calls.append(state)
+        return ['Keith Self'] if len(calls) == 1 else None
+
+    scrape('Texas')
+    time.sleep(0.15)
+    assert scrape.lookup('Texas').stale
+    wait_for(lambda: len(calls) == 2 and not result_cache.get_stats()['background_refresh']['in_progress'])
+
+    for _ in range(2):
+        assert scrape.lookup('Texas').value == ['Keith Self']
+    time.sleep(0.05)
+    assert len(calls) == 2
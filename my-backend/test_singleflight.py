@@ -0,0 +1,78 @@
+"""Single-flight: concurrent identical calls share one execution."""
+import threading
+import time
+
+from result_cache import memoize
+from singleflight import SingleFlight
+
+
+def run_together(count, fn):
+    """Call fn from count threads at once; returns their results."""
+    results = [None] * count
+
+    def run(index):
+        results[index] = fn()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return 'value'
+
+    def call():
+        return flight.do('key', slow)
+
+    def let_go():
+        # Everyone else has had time to join the leader's call.
+        time.sleep(0.2)
+        release.set()
+
+    threading.Thread(target=let_go).start()
+    assert run_together(5, call) == ['value'] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {'executed': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise ValueError('upstream down')
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except ValueError as e:
+            return str(e)
+
+    threading.Timer(0.2, release.set).start()
+    assert run_together(3, call) == ['upstream down'] * 3
+    # A later call runs again rather than replaying the error.
+    assert flight.do('key', lambda: 'recovered') == 'recovered'
+
+
+def test_memoize_coalesces_concurrent_misses():
+    calls = []
+
+    @memoize('test_coalesced_misses', 60)
+    def scrape(state):
+        calls.append(state)
+        time.sleep(0.2)
+        return [state]
+
+    assert run_together(4, lambda: scrape('Ohio')) == [['Ohio']] * 4
+    assert len(calls) == 1
@@ -0,0 +1,59 @@
+"""Writing a snapshot and serving lookups from it."""
+import os
+import stat
+
+from snapshot import EMPTY_VALUES, SnapshotStore, snapshot_key, write_snapshot
+
+HOUSE = [{'name': 'Keith Self', 'party': 'Keith Self(R)', 'link': 'https://ballotpedia.org/Keith_Self'}]
+MUNICIPAL = {'candidates': [{'name': 'Jim Skinner'}], 'demographics': []}
+BIO = {'bio': 'Rafael Edward Cruz is an American politician.', 'image_url': None}
+
+
+def build(path):
+    sections = {
+        'house': {snapshot_key('Texas', '3rd'): HOUSE, snapshot_key('Wyoming', 'At-Large'): HOUSE},
+        'senate': {snapshot_key('Texas'): [{'name': 'Ted Cruz'}]},
+        'municipal': {snapshot_key('Collin County', 'Texas'): MUNICIPAL},
+        'bio': {snapshot_key('Ted Cruz'): BIO},
+    }
+    return write_snapshot(str(path), sections, version='20241105T000000Z')
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    assert build(path) == '20241105T000000Z'
+    store = SnapshotStore(str(path))
+
+    assert store.lookup('house', 'Texas', '3rd').value == HOUSE
+    assert store.lookup('senate', 'texas').value == [{'name': 'Ted Cruz'}]
+    assert store.lookup('municipal', 'Collin_County', 'Texas').value == MUNICIPAL
+    assert store.lookup('bio', ' ted  cruz ').value == BIO
+    assert store.lookup('voter_info', 'Texas').value == EMPTY_VALUES['voter_info']
+    assert store.lookup('house', 'Texas', '4th').value == EMPTY_VALUES['house']
+
+    result = store.lookup('house', 'Texas', '3rd')
+    assert not result.stale and result.etag.startswith('20241105T000000Z|house|')
+    assert store.stats()['districts'] == 2
+
+
+def test_house_lookups_use_the_crawls_district_labels(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    build(path)
+    store = SnapshotStore(str(path))
+
+    for district in ('3', 'District 3', '3rd'):
+        assert store.lookup('house', 'Texas', district).value == HOUSE
+    assert store.lookup('house', 'Wyoming', 'at-large').value == HOUSE
+
+
+def test_replaced_file_is_picked_up_and_readable(tmp_path):
+    path = tmp_path / 'snapshot.json'
+    build(path)
+    store = SnapshotStore(str(path), check_interval=0)
+    write_snapshot(str(path), {'senate': {snapshot_key('Texas'): []}}, version='20241106T000000Z')
+
+    assert store.lookup('senate', 'Texas').value == []
+    assert store.stats()['version'] == '20241106T000000Z'
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644 & ~umask
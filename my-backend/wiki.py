@@ -1,34 +1,48 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+import json
+import os
 import re
+from urllib.parse import urlencode
 
-def get_wikipedia_bio(name, role):
-    search_name = "_".join(name.split())
-    url = f"https://en.wikipedia.org/wiki/{search_name}"
+from http_client import fetch_page
+from parsing import make_soup, memoized_parse
+from result_cache import BIO_TTL, memoize
 
-    response = requests.get(url)
-    
-    if response.status_code != 200:
-        return {"bio": "No biography found.", "image_url": None}
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
+# The infobox (for the portrait) and body paragraphs.
+BIO_TAGS = SoupStrainer(['table', 'p'])
 
-    infobox = soup.find('table', class_='infobox')
-    image_url = None
-    if infobox:
-        image = infobox.find('img')
-        if image:
-            image_url = "https:" + image['src']
+# 'api' asks the MediaWiki API for just the lead section's text and the page
+# image (a few KB) and only falls back to the article HTML when that fails;
+# 'html' always reads the article.
+BIO_SOURCE = os.environ.get('WIKI_BIO_SOURCE', 'api')
 
-    bio_paragraphs = soup.find_all('p')
+# Roughly the width of the infobox portrait the HTML path returns.
+PAGE_IMAGE_WIDTH = 220
 
-    if not bio_paragraphs:
-        return {"bio": "No biography found.", "image_url": image_url}
+def construct_wikipedia_url(name):
+    search_name = "_".join(name.split())
+    return f"https://en.wikipedia.org/wiki/{search_name}"
+
+def construct_wikipedia_api_url(name):
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': 2,
+        'prop': 'extracts|pageimages',
+        'exintro': 1,
+        'explaintext': 1,
+        'piprop': 'thumbnail',
+        'pithumbsize': PAGE_IMAGE_WIDTH,
+        'redirects': 1,
+        'titles': "_".join(name.split()),
+    }
+    return f"https://en.wikipedia.org/w/api.php?{urlencode(params)}"
 
+def format_bio(paragraphs, image_url):
     bio = ""
-    for paragraph in bio_paragraphs:
-        if paragraph.text.strip():
-            cleaned_text = re.sub(r'\[\d+\]', '', paragraph.text)
+    for paragraph in paragraphs:
+        if paragraph.strip():
+            cleaned_text = re.sub(r'\[\d+\]', '', paragraph)
             cleaned_text = cleaned_text.replace('"', '').replace("'", '')
             cleaned_text = re.sub(r'(\w+)ss\b', r"\1s's", cleaned_text)
             bio += cleaned_text.strip() + "\n"
@@ -42,3 +56,64 @@ def get_wikipedia_bio(name, role):
         return {"bio": "No relevant biography found.", "image_url": None}
 
     return {"bio": bio.strip(), "image_url": image_url}
+
+def parse_wikipedia_bio(html):
+    soup = make_soup(html, BIO_TAGS)
+
+    infobox = soup.find('table', class_='infobox')
+    image_url = None
+    if infobox:
+        image = infobox.find('img')
+        if image:
+            image_url = "https:" + image['src']
+
+    bio_paragraphs = soup.find_all('p')
+
+    if not bio_paragraphs:
+        return {"bio": "No biography found.", "image_url": image_url}
+
+    return format_bio((paragraph.text for paragraph in bio_paragraphs), image_url)
+
+def parse_wikipedia_extract(text):
+    """Bio from an API extracts+pageimages response, or None when the response can't be used.
+
+    An extract too short to make a bio is unusable too: the lead section
+    alone may be short where the article's HTML still has one.
+    """
+    try:
+        pages = json.loads(text)['query']['pages']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not pages:
+        return None
+
+    page = pages[0]
+    if page.get('missing') or page.get('invalid'):
+        return {"bio": "No biography found.", "image_url": None}
+    if not page.get('extract'):
+        return None
+
+    image_url = page.get('thumbnail', {}).get('source')
+    bio = format_bio(page['extract'].split("\n"), image_url)
+    if bio['bio'] == "No relevant biography found.":
+        return None
+    return bio
+
+# The role doesn't change which article is read, so a bio cached for one
+# role serves them all.
+@memoize('bio', BIO_TTL, key_args=lambda name, role: (name,))
+def get_wikipedia_bio(name, role):
+    if BIO_SOURCE == 'api':
+        text = fetch_page(construct_wikipedia_api_url(name))
+        bio = memoized_parse(parse_wikipedia_extract, text) if text is not None else None
+        if bio is not None:
+            return bio
+
+    url = construct_wikipedia_url(name)
+
+    html = fetch_page(url)
+    
+    if html is None:
+        return {"bio": "No biography found.", "image_url": None}
+
+    return memoized_parse(parse_wikipedia_bio, html)